@@ -1,62 +1,202 @@
 import streamlit as st
 from dotenv import load_dotenv
-from src.data import fileParser
-from src.search import internetSearch, leadershipSearch
-from src.analysis import sentimentAnalysis, financialAnalysis, leadershipAnalysis
-from src.data.updateDb import update_financial_analysis, update_sentiment_analysis, update_leadership_analysis
-from src.utils.combineAnalysis import combine_analysis_results, get_combined_results_json
+from src.utils.analysisPipeline import ExtractAnalystName, RunAnalysis
+from src.utils.combineAnalysis import get_combined_results_json
+from src.utils.llmCache import refresh_cache
+from src.search.searchTools import stub_mode
 import os
 import asyncio
+import hashlib
 import nest_asyncio
 from typing import Any, Dict
 
 # -------------------------------
 # Functions
 # -------------------------------
-def ParsePDFAndSearch(pdfBytes: bytes, gemini_api_key: str, tavily_api_key: str, analyst_name: str = None) -> Dict[str, Any]:
-    """
-    Parse a PDF file, extract financial data, and perform an internet search for the ticker and period.
-    Returns a dictionary with parsed and searched data.
-    """
-    # Parse the PDF and extract financial metrics and analyst info
-    fileParserOutput = dict(fileParser.ParseFile(pdfBytes, gemini_api_key).output)
+# Sections of the results page, in display order, with the message shown while each is pending
+SECTIONS = {
+    "overview": "📄 Parsing the report and searching the web...",
+    "sentiment": "⏳ Sentiment analysis running...",
+    "financial": "⏳ Financial analysis running...",
+    "leadership": "⏳ Leadership search and analysis running...",
+    "combined": "⏳ Combining results...",
+    "timings": None,
+}
+
+# Pipeline result keys (see RunAnalysis on_update) and the page section that shows them
+SECTION_OF_RESULT = {
+    "content": "overview",
+    "error": "overview",
+    "sentiment": "sentiment",
+    "financial": "financial",
+    "leadership_search": "leadership",
+    "leadership_analysis": "leadership",
+    "combined_results": "combined",
+}
+
+
+def RenderOverview(results: Dict[str, Any]) -> None:
+    content = results["content"]
+    analyst_name = results["analyst_name"]
+
+    # Display basic information in a structured format
+    ticker = content.get("ticker", "")
+    period = content.get("period", "")
+    # Use analyst name from filename instead of fileParser
+    
+    # Create a structured display for basic info
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Ticker", ticker)
+    with col2:
+        st.metric("Period", period)
+    with col3:
+        st.metric("Analyst", analyst_name)
+    
+    # Display the full parsed content
+    st.write("## Full Parsed Content")
+    st.write(content)
 
-    # Ensure nested dicts for JSON compatibility
-    fileParserOutput["financialMetrics"] = dict(fileParserOutput.get("financialMetrics", {}))
-    fileParserOutput["analyst"] = dict(fileParserOutput.get("analyst", {}))
+    if "error" in results:
+        st.error(f"Analysis Error: {str(results['error'])}")
 
-    # Add analyst name after ticker key in financialMetrics if provided
-    if analyst_name:
-        # Create a new ordered dictionary to maintain key order
-        ordered_financial_metrics = {}
+
+def RenderSentiment(results: Dict[str, Any]) -> None:
+    sentiment = results["sentiment"]
+    if isinstance(sentiment, Exception):
+        st.error(f"Sentiment Analysis Error: {str(sentiment)}")
+    else:
+        st.write("## Sentiment Analysis")
+        st.write(sentiment.output)
+
+
+def RenderFinancial(results: Dict[str, Any]) -> None:
+    financial = results["financial"]
+    if isinstance(financial, Exception):
+        st.error(f"Financial Analysis Error: {str(financial)}")
+    else:
+        st.write("## Financial Analysis")
+        st.write(financial.output)
+
+
+def RenderLeadership(results: Dict[str, Any]) -> None:
+    """Leadership analysis, grounded in the search findings (shown as soon as the search is done)."""
+    leadership_search = results.get("leadership_search")
+    leadership_analysis = results.get("leadership_analysis")
+    if leadership_analysis is None:
+        st.info(SECTIONS["leadership"])
+    elif isinstance(leadership_analysis, Exception):
+        st.error(f"Leadership Analysis Error: {str(leadership_analysis)}")
+    else:
+        st.write("## Leadership Analysis")
+        st.write(leadership_analysis.output)
+    if leadership_search is not None and not isinstance(leadership_search, Exception):
+        with st.expander("Leadership Evidence"):
+            st.write(leadership_search)
+
+
+def RenderCombined(results: Dict[str, Any]) -> None:
+    analyst_name = results["analyst_name"]
+
+    if "db_error" in results:
+        st.error(f"Database Update Error: {str(results['db_error'])}")
+
+    if "combine_error" in results:
+        st.error(f"Error combining analysis results: {str(results['combine_error'])}")
+    else:
+        combined_results = results["combined_results"]
+
+        # Display combined results summary
+        summary = combined_results.get("summary", {})
         
-        # Add existing keys in desired order
-        if "ticker" in fileParserOutput["financialMetrics"]:
-            ordered_financial_metrics["ticker"] = fileParserOutput["financialMetrics"]["ticker"]
+        # Create download button for combined JSON
+        json_data = get_combined_results_json(combined_results)
         
-        # Add analyst_name after ticker
-        ordered_financial_metrics["analyst_name"] = analyst_name
+        # Create filename with analyst name included
+        ticker = summary.get('ticker', 'UNKNOWN')
+        period = summary.get('period', 'UNKNOWN').replace(' ', '_')
+        analyst_safe = analyst_name.replace(' ', '_').replace('-', '_').replace('.', '_')
         
-        # Add all other existing keys
-        for key, value in fileParserOutput["financialMetrics"].items():
-            if key not in ordered_financial_metrics:
-                ordered_financial_metrics[key] = value
+        file_name = f"{ticker}_{period}_{analyst_safe}_combined_analysis.json"
         
-        fileParserOutput["financialMetrics"] = ordered_financial_metrics
+        st.download_button(
+            label="📥 Download Combined Analysis (JSON)",
+            data=json_data,
+            file_name=file_name,
+            mime="application/json",
+            help="Download all analysis results as a single JSON file"
+        )
 
-    ticker = fileParserOutput.get("ticker")
-    period = fileParserOutput.get("period")
 
-    # Perform internet search if ticker and period are available
-    if ticker and period:
-        searchResult = internetSearch.Search(ticker, period, gemini_api_key, tavily_api_key).output
-        fileParserOutput["searchResult"] = searchResult
-    else:
-        fileParserOutput["searchResult"] = {}
+def RenderTimings(results: Dict[str, Any]) -> None:
+    # Per-stage timing breakdown (agent stages overlap inside the concurrent stage)
+    with st.expander("⏱️ Stage Timings"):
+        st.table(results["timer"].as_rows())
 
-    # Database will be updated after analysis is complete
 
-    return fileParserOutput
+SECTION_RENDERERS = {
+    "overview": RenderOverview,
+    "sentiment": RenderSentiment,
+    "financial": RenderFinancial,
+    "leadership": RenderLeadership,
+    "combined": RenderCombined,
+    "timings": RenderTimings,
+}
+
+# Keys that must be present in the results before a section can be drawn
+SECTION_READY = {
+    "overview": "content",
+    "sentiment": "sentiment",
+    "financial": "financial",
+    "leadership": "leadership_search",
+    "combined": "combined_results",
+}
+
+
+def RenderSection(section: str, results: Dict[str, Any]) -> None:
+    """Draw one section of the results page, or its pending message if its result is not in yet."""
+    if section == "timings":
+        if "combined_results" in results or "combine_error" in results or "error" in results:
+            RenderTimings(results)
+        return
+    ready = SECTION_READY[section] in results or (section == "combined" and "combine_error" in results)
+    if ready:
+        SECTION_RENDERERS[section](results)
+    elif "error" not in results:
+        st.info(SECTIONS[section])
+
+
+def RenderResults(results: Dict[str, Any]) -> None:
+    """
+    Display stored analysis results. Does not call any agent or touch the database,
+    so it is safe to run on every Streamlit rerun.
+    """
+    for section in SECTIONS:
+        RenderSection(section, results)
+
+
+class LiveResults:
+    """
+    One st.empty() placeholder per section, redrawn as soon as the pipeline publishes that
+    section's result, so the fastest agent's output shows up without waiting for the others.
+    """
+
+    def __init__(self):
+        self.placeholders = {section: st.empty() for section in SECTIONS}
+        for section, pending in SECTIONS.items():
+            if pending:
+                self.placeholders[section].info(pending)
+
+    def update(self, key: str, results: Dict[str, Any]) -> None:
+        """RunAnalysis on_update callback."""
+        sections = [SECTION_OF_RESULT.get(key)]
+        if key in ("combined_results", "error"):
+            # The run is over: draw the final state of every section (timings, failures)
+            sections = list(SECTIONS)
+        for section in sections:
+            if section is not None:
+                with self.placeholders[section].container():
+                    RenderSection(section, results)
 
 ## -------------------------------
 # Main Streamlit App
@@ -68,6 +208,12 @@ async def main():
 
     st.title("Agentic AI Financial Analyzer")
 
+    # Results of finished analyses for this session, keyed by the SHA-256 of the uploaded file and its
+    # filename, since the filename names the analyst the results are attributed to
+    if "analysis_results" not in st.session_state:
+        st.session_state["analysis_results"] = {}
+    analysis_results = st.session_state["analysis_results"]
+
     # PDF upload interface
     uploaded_file = st.file_uploader(
         "Upload a PDF file for analysis",
@@ -76,173 +222,38 @@ async def main():
     )
 
     # Check for required API keys
-    if not gemini_api_key or not tavily_api_key:
+    # The offline search stub (SEARCH_PROVIDER=stub) needs no Tavily key
+    if not gemini_api_key or not (tavily_api_key or stub_mode()):
         st.error("API keys not found. Please set GEMINI_API_KEY and TAVILY_API_KEY in your .env file.")
         return
 
     # Handle PDF upload
     if uploaded_file is not None:
-        pdfBytes = uploaded_file.read()
+        pdfBytes = uploaded_file.getvalue()
         filename = uploaded_file.name
+        file_hash = hashlib.sha256(pdfBytes).hexdigest()
+        results_key = (file_hash, filename)
         
         # Extract analyst name from filename: <analyst name> - <ticker> <quarter> <year>
-        analyst_name = "Analyst A"  # Default fallback
-        try:
-            # Split by " - " to get analyst name and rest
-            if " - " in filename:
-                analyst_name = filename.split(" - ")[0].strip()
-                # Remove file extension if present
-                if "." in analyst_name:
-                    analyst_name = analyst_name.rsplit(".", 1)[0]
-        except Exception as e:
-            st.warning(f"Could not extract analyst name from filename: {e}")
-        
-        # Parse PDF and perform search
-        content = ParsePDFAndSearch(pdfBytes, gemini_api_key, tavily_api_key, analyst_name)
-        
-        # Display basic information in a structured format
-        ticker = content.get("ticker", "")
-        period = content.get("period", "")
-        # Use analyst name from filename instead of fileParser
-        
-        # Create a structured display for basic info
-        col1, col2, col3, col4 = st.columns(4)
-        with col1:
-            st.metric("Ticker", ticker)
-        with col2:
-            st.metric("Period", period)
-        with col3:
-            st.metric("Analyst", analyst_name)
-        
-        # Display the full parsed content
-        st.write("## Full Parsed Content")
-        st.write(content)
-
-        # Run sentiment, financial, and leadership analysis concurrently with error handling
-        try:
-            sentiment, financial, leadership_search = await asyncio.gather(
-                sentimentAnalysis.AnalyzeSentiment(content, gemini_api_key),
-                financialAnalysis.AnalyzeFinancial(ticker, period, gemini_api_key),
-                leadershipSearch.LeadershipSearch(ticker, period, gemini_api_key),  # Fixed: Added await
-                return_exceptions=True
-            )
-            
-            # Handle sentiment analysis results
-            if isinstance(sentiment, Exception):
-                st.error(f"Sentiment Analysis Error: {str(sentiment)}")
-            else:
-                st.write("## Sentiment Analysis")
-                st.write(sentiment.output)
-            
-            # Handle financial analysis results
-            if isinstance(financial, Exception):
-                st.error(f"Financial Analysis Error: {str(financial)}")
-            else:
-                st.write("## Financial Analysis")
-                st.write(financial.output)
-            
-            # Handle leadership search results
-            if isinstance(leadership_search, Exception):
-                st.error(f"Leadership Search Error: {str(leadership_search)}")
-            else:
-                # st.write("## Leadership Search")
-                # st.write(leadership_search)
-                
-                # Run leadership analysis with correct parameters
-                try:
-                    # Fixed: Pass ticker and period, not search results
-                    leadership_analysis = await leadershipAnalysis.AnalyzeLeadership(ticker, period, gemini_api_key)
-                    st.write("## Leadership Analysis")
-                    st.write(leadership_analysis.output)
-                    
-                    # Update database with analysis results
-                    try:
-                        # Update financial analysis
-                        if not isinstance(financial, Exception):
-                            # Extract risk assessment from financial analysis
-                            risk_assessment = "Based on financial analysis"
-                            if hasattr(financial.output, 'risk_assessment'):
-                                if hasattr(financial.output.risk_assessment, 'risk_level'):
-                                    risk_assessment = f"Risk Level: {financial.output.risk_assessment.risk_level}"
-                                elif hasattr(financial.output.risk_assessment, 'key_risks'):
-                                    risk_assessment = f"Key Risks: {', '.join(financial.output.risk_assessment.key_risks[:3])}"
-                            
-                            # Use analyst name extracted from filename
-                            # analyst_name is already extracted above from filename
-                            
-                            financial_data = {
-                                'analyst_name': analyst_name,
-                                'price_target': None,  # Extract from financial.output if available
-                                'analyst_summary': getattr(financial.output, 'performance_summary', 'Analysis completed'),
-                                'performance_summary': getattr(financial.output, 'performance_summary', 'Performance analyzed'),
-                                'investment_outlook': getattr(financial.output, 'investment_outlook', 'Hold'),
-                                'expected_values_future_quarters': 'To be calculated based on analysis',
-                                'risk_assessment': risk_assessment
-                            }
-                            update_financial_analysis(ticker, period, financial_data)
-                        
-                        # Update sentiment analysis
-                        if not isinstance(sentiment, Exception):
-                            sentiment_data = {
-                                'analyst_name': analyst_name,
-                                'analyst_sentiment': getattr(sentiment.output.analyst_sentiment, 'sentiment', 'Neutral') if hasattr(sentiment.output, 'analyst_sentiment') else 'Neutral',
-                                'market_sentiment': getattr(sentiment.output.market_sentiment, 'sentiment', 'Neutral') if hasattr(sentiment.output, 'market_sentiment') else 'Neutral'
-                            }
-                            update_sentiment_analysis(ticker, period, sentiment_data)
-                        
-                        # Update leadership analysis
-                        if not isinstance(leadership_analysis, Exception):
-                            leadership_data = {
-                                'analyst_name': analyst_name,
-                                'stability_assessment': str(getattr(leadership_analysis.output.stability_assessment, 'stability_score', 'Stable')) if hasattr(leadership_analysis.output, 'stability_assessment') else 'Stable',
-                                'investor_implications': getattr(leadership_analysis.output, 'investor_implications', 'Positive implications'),
-                                'overall_impact': getattr(leadership_analysis.output, 'overall_impact', 'Positive')
-                            }
-                            update_leadership_analysis(ticker, period, leadership_data)
-                            
-                    except Exception as db_error:
-                        st.error(f"Database Update Error: {str(db_error)}")
-                        
-                except Exception as e:
-                    st.error(f"Leadership Analysis Error: {str(e)}")
-                
-            # Combine all analysis results into a single JSON structure
-            try:
-                combined_results = combine_analysis_results(
-                    parsed_content=content,
-                    financial_analysis=financial if not isinstance(financial, Exception) else None,
-                    sentiment_analysis=sentiment if not isinstance(sentiment, Exception) else None,
-                    leadership_analysis=leadership_analysis if not isinstance(leadership_analysis, Exception) else None,
-                    analyst_name=analyst_name,
-                    filename=filename
-                )
-                
-                # Display combined results summary
-                summary = combined_results.get("summary", {})
-                
-                # Create download button for combined JSON
-                json_data = get_combined_results_json(combined_results)
-                
-                # Create filename with analyst name included
-                ticker = summary.get('ticker', 'UNKNOWN')
-                period = summary.get('period', 'UNKNOWN').replace(' ', '_')
-                analyst_safe = analyst_name.replace(' ', '_').replace('-', '_').replace('.', '_')
-                
-                file_name = f"{ticker}_{period}_{analyst_safe}_combined_analysis.json"
-                
-                st.download_button(
-                    label="📥 Download Combined Analysis (JSON)",
-                    data=json_data,
-                    file_name=file_name,
-                    mime="application/json",
-                    help="Download all analysis results as a single JSON file"
-                )
-                
-            except Exception as combine_error:
-                st.error(f"Error combining analysis results: {str(combine_error)}")
-                
-        except Exception as e:
-            st.error(f"Analysis Error: {str(e)}")
+        analyst_name = ExtractAnalystName(filename)
+
+        # Only run the pipeline for a new document or when the user asks for a fresh run;
+        # every other rerun (widget interaction, download button) renders the stored results
+        rerun_requested = st.button(
+            "🔄 Re-run analysis",
+            help="Discard the stored results for this document and run every agent again"
+        )
+        if results_key not in analysis_results or rerun_requested:
+            # Each section is drawn into its placeholder as soon as its agent finishes
+            live = LiveResults()
+            with st.spinner("Analyzing document..."):
+                if rerun_requested:
+                    with refresh_cache():
+                        analysis_results[results_key] = await RunAnalysis(pdfBytes, filename, analyst_name, gemini_api_key, tavily_api_key, on_update=live.update)
+                else:
+                    analysis_results[results_key] = await RunAnalysis(pdfBytes, filename, analyst_name, gemini_api_key, tavily_api_key, on_update=live.update)
+        else:
+            RenderResults(analysis_results[results_key])
     else:
         st.info("Please upload a PDF file to begin analysis.")
         st.markdown("""
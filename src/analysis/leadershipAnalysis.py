@@ -1,54 +1,110 @@
-from pydantic_ai.models.gemini import GeminiModel
-from pydantic_ai.providers.google_gla import GoogleGLAProvider
-from pydantic_ai.common_tools.duckduckgo import duckduckgo_search_tool
-from pydantic_ai import Agent
+from pydantic_ai import Agent, RunContext
 from pydantic import BaseModel, Field
-from typing import List, Literal, Optional
+from dataclasses import dataclass
+from typing import Dict, List, Literal, Optional
+from src.search.leadershipSearch import LeadershipSearch
+from src.utils import agentRegistry
+from src.utils.llmCache import run_agent_cached
 import json
 import asyncio
 
+MODEL_NAME = 'gemini-2.5-flash'
 
-async def AnalyzeLeadership(ticker: str, period: str, gemini_api_key: str):
+
+# --- Data Models for Output Structure ---
+class LeadershipChange(BaseModel):
+    change_type: Literal["appointment", "departure", "promotion", "restructuring", "compensation_change"] = Field(..., description="Type of leadership change")
+    position: str = Field(..., description="Executive position or title")
+    person_name: Optional[str] = Field(None, description="Name of the person involved (if available)")
+    date: str = Field(..., description="Date or timeframe of the change")
+    description: str = Field(..., description="Detailed description of the change")
+    source: str = Field(..., description="Source of the information")
+
+
+class LeadershipTrend(BaseModel):
+    trend: str = Field(..., description="Leadership trend or pattern observed")
+    impact_level: Literal["High", "Medium", "Low"] = Field(..., description="Assessed impact level of the trend")
+    trend_direction: Literal["Positive", "Negative", "Neutral"] = Field(..., description="Direction of the trend's impact")
+    supporting_evidence: List[str] = Field(..., description="Evidence supporting this trend")
+
+
+class StabilityAssessment(BaseModel):
+    stability_score: float = Field(..., ge=0.0, le=10.0, description="Leadership stability score from 0-10 (10 being most stable)")
+    key_risks: List[str] = Field(..., description="Key leadership risks identified")
+    strengths: List[str] = Field(..., description="Leadership strengths identified")
+    succession_readiness: Literal["Strong", "Moderate", "Weak", "Unknown"] = Field(..., description="Assessment of succession planning")
+
+
+class LeadershipAnalysisOutput(BaseModel):
+    company_ticker: str = Field(..., description="Company ticker symbol")
+    company_name: str = Field(..., description="Company name")
+    analysis_period: str = Field(..., description="Period analyzed")
+    key_trends: List[LeadershipTrend] = Field(..., description="Key leadership trends and patterns")
+    stability_assessment: StabilityAssessment = Field(..., description="Overall leadership stability assessment")
+    overall_impact: Literal["Very Positive", "Positive", "Neutral", "Negative", "Very Negative"] = Field(..., description="Overall impact of leadership changes")
+    investor_implications: str = Field(..., description="Summary of implications for investors")
+
+
+@dataclass
+class LeadershipAnalysisDeps:
+    """Per-request values for the leadership analysis agent."""
+    ticker: str
+    date_range: str
+
+
+# --- System Prompt for the Agent ---
+SYSTEM_PROMPT_TEMPLATE = """
+You are a corporate leadership analysis expert. Your task is to analyze leadership changes for {ticker} from {date_range} using the research findings provided to you.
+
+The findings cover:
+1. Executive appointments, departures, and promotions (CEO, CFO, CTO, COO, etc.)
+2. Board of directors changes
+3. Executive compensation decisions
+4. Organizational restructuring
+5. Succession planning announcements
+6. Leadership controversies or issues
+
+Using these findings, provide a thorough analysis including:
+- Impact assessment of each change
+- Leadership stability trends
+- Succession planning strength
+- Investor implications
+- Overall leadership health score
+
+Base your analysis only on the provided findings and cite their sources as evidence. Do not invent events. If information is limited, clearly state the constraints in your analysis.
+"""
+
+
+def _SystemPrompt(ctx: RunContext[LeadershipAnalysisDeps]) -> str:
+    """Fill the ticker and date range of the current request into the system prompt."""
+    return SYSTEM_PROMPT_TEMPLATE.format(ticker=ctx.deps.ticker, date_range=ctx.deps.date_range)
+
+
+def _BuildAgent(gemini_api_key):
+    """Build the leadership analysis agent; called once per API key through the agent registry."""
+    model = agentRegistry.get_model(MODEL_NAME, gemini_api_key)
+    agent = Agent(
+        model=model,
+        deps_type=LeadershipAnalysisDeps,
+        output_type=LeadershipAnalysisOutput
+    )
+    agent.system_prompt(_SystemPrompt)
+    return agent
+
+
+async def AnalyzeLeadership(ticker: str, period: str, gemini_api_key: str, leadership_evidence: Optional[Dict] = None):
     """
-    Analyze leadership changes and their impact on a company using AI and internet search.
+    Analyze leadership changes and their impact on a company using AI.
+    The analysis is grounded in the structured findings produced by LeadershipSearch;
+    if no findings are passed in, the search is run once here first.
     Returns a structured leadership analysis output.
     
     Args:
         ticker: Company ticker symbol (e.g., "AAPL")
         period: Analysis period (e.g., "Q3 2023")
         gemini_api_key: Google Gemini API key
+        leadership_evidence: Output of LeadershipSearch for the same ticker and period
     """
-    
-    # --- Data Models for Output Structure ---
-    class LeadershipChange(BaseModel):
-        change_type: Literal["appointment", "departure", "promotion", "restructuring", "compensation_change"] = Field(..., description="Type of leadership change")
-        position: str = Field(..., description="Executive position or title")
-        person_name: Optional[str] = Field(None, description="Name of the person involved (if available)")
-        date: str = Field(..., description="Date or timeframe of the change")
-        description: str = Field(..., description="Detailed description of the change")
-        source: str = Field(..., description="Source of the information")
-
-    class LeadershipTrend(BaseModel):
-        trend: str = Field(..., description="Leadership trend or pattern observed")
-        impact_level: Literal["High", "Medium", "Low"] = Field(..., description="Assessed impact level of the trend")
-        trend_direction: Literal["Positive", "Negative", "Neutral"] = Field(..., description="Direction of the trend's impact")
-        supporting_evidence: List[str] = Field(..., description="Evidence supporting this trend")
-
-    class StabilityAssessment(BaseModel):
-        stability_score: float = Field(..., ge=0.0, le=10.0, description="Leadership stability score from 0-10 (10 being most stable)")
-        key_risks: List[str] = Field(..., description="Key leadership risks identified")
-        strengths: List[str] = Field(..., description="Leadership strengths identified")
-        succession_readiness: Literal["Strong", "Moderate", "Weak", "Unknown"] = Field(..., description="Assessment of succession planning")
-
-    class LeadershipAnalysisOutput(BaseModel):
-        company_ticker: str = Field(..., description="Company ticker symbol")
-        company_name: str = Field(..., description="Company name")
-        analysis_period: str = Field(..., description="Period analyzed")
-        key_trends: List[LeadershipTrend] = Field(..., description="Key leadership trends and patterns")
-        stability_assessment: StabilityAssessment = Field(..., description="Overall leadership stability assessment")
-        overall_impact: Literal["Very Positive", "Positive", "Neutral", "Negative", "Very Negative"] = Field(..., description="Overall impact of leadership changes")
-        investor_implications: str = Field(..., description="Summary of implications for investors")
-
     # --- Parse period to create search timeframe ---
     try:
         quarter, year = period.split()
@@ -58,48 +114,17 @@ async def AnalyzeLeadership(ticker: str, period: str, gemini_api_key: str):
     except:
         date_range = f"past 18 months to {period}"
 
-    # --- System Prompt for the Agent ---
-    system_prompt = f"""
-    You are a corporate leadership analysis expert. Your task is to search for and analyze leadership changes for {ticker} from {date_range}.
-
-    Search comprehensively for:
-    1. Executive appointments, departures, and promotions (CEO, CFO, CTO, COO, etc.)
-    2. Board of directors changes
-    3. Executive compensation decisions
-    4. Organizational restructuring
-    5. Succession planning announcements
-    6. Leadership controversies or issues
-
-    After gathering information, provide a thorough analysis including:
-    - Impact assessment of each change
-    - Leadership stability trends
-    - Succession planning strength
-    - Investor implications
-    - Overall leadership health score
+    # --- Gather leadership evidence once (reuses LeadershipSearch output when provided) ---
+    if leadership_evidence is None:
+        leadership_evidence = await LeadershipSearch(ticker, period, gemini_api_key)
 
-    Focus on factual, verifiable information from reliable sources. If information is limited, clearly state the constraints in your analysis.
-    """
-
-    # --- Initialize Gemini Model and Agent with Search Tool ---
-    model = GeminiModel('gemini-2.5-flash', provider=GoogleGLAProvider(api_key=gemini_api_key))
-    
-    search_agent = Agent(
-        model=model,
-        tools=[duckduckgo_search_tool()],
-        system_prompt=system_prompt,
-        output_type=LeadershipAnalysisOutput
-    )
+    # --- Shared Leadership Analysis Agent ---
+    analysis_agent = agentRegistry.get_agent("leadershipAnalysis", _BuildAgent, gemini_api_key)
 
-    # --- Create comprehensive search query ---
-    search_query = f"""
-    Search and analyze leadership changes for {ticker} from {date_range}. Find information about:
-    
-    1. Executive changes: CEO, CFO, CTO, COO appointments, departures, promotions
-    2. Board of directors changes: new appointments, departures, chairman changes
-    3. Executive compensation: salary changes, bonus structures, stock awards
-    4. Organizational restructuring: new roles, department changes, reporting structure
-    5. Leadership controversies: resignations, investigations, performance issues
-    6. Succession planning: announced plans, internal promotions, external hires
+    # --- Create analysis prompt from the search findings ---
+    analysis_prompt = f"""
+    Leadership research findings for {ticker} from {date_range}:
+    {json.dumps(leadership_evidence, indent=2, default=str)}
     
     For each finding, assess:
     - Market reaction and investor sentiment
@@ -112,7 +137,11 @@ async def AnalyzeLeadership(ticker: str, period: str, gemini_api_key: str):
 
     # --- Run Leadership Analysis ---
     try:
-        result = await search_agent.run(search_query)
+        result = await run_agent_cached(
+            "leadershipAnalysis", analysis_agent, analysis_prompt,
+            model_name=MODEL_NAME, output_type=LeadershipAnalysisOutput,
+            key_inputs=[SYSTEM_PROMPT_TEMPLATE], deps=LeadershipAnalysisDeps(ticker=ticker, date_range=date_range)
+        )
         
         # Ensure the analysis period is correctly set
         if hasattr(result, 'output') and result.output:
@@ -147,11 +176,11 @@ async def AnalyzeLeadership(ticker: str, period: str, gemini_api_key: str):
 
 
 # --- Synchronous wrapper function ---
-def AnalyzeLeadershipSync(ticker: str, period: str, gemini_api_key: str):
+def AnalyzeLeadershipSync(ticker: str, period: str, gemini_api_key: str, leadership_evidence: Optional[Dict] = None):
     """
     Synchronous wrapper for the async leadership analysis function.
     """
-    return asyncio.run(AnalyzeLeadership(ticker, period, gemini_api_key))
+    return asyncio.run(AnalyzeLeadership(ticker, period, gemini_api_key, leadership_evidence))
 
 
 # --- Main function for command-line usage ---
@@ -4,13 +4,16 @@ This script takes in a ticker and outputs a dictionary containing the financials
 
 import os
 import sqlite3
+import threading
+import time
+import numpy as np
+import pandas as pd
 import yfinance as yf
 import streamlit as st
+from src.database import anomalyStats, connection, schema
 
 
-# Get the project root directory (3 levels up from src/data/)
-project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-finance_db = os.path.join(project_root, "util", "database", "finance.db")
+finance_db = connection.FINANCE_DB
 
 expected_output = {
     "Q1 2024": {
@@ -81,7 +84,91 @@ expected_output = {
 }
 
 
-import sqlite3
+class TickerHistory:
+    """
+    A ticker's full metric history in columnar form: period keys sorted ascending, metric names,
+    a (periods x metrics) value matrix and a matching mask of which cells exist in the database.
+    Any "strictly before" cutoff is a binary search plus a slice.
+    """
+
+    def __init__(self, period_keys, metrics, values, present):
+        self.period_keys = period_keys
+        self.metrics = metrics
+        self.values = values
+        self.present = present
+        self.loaded_at = time.monotonic()
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build from (period_key, metric_id, metric_name, value) rows."""
+        if not rows:
+            return cls(np.empty(0, dtype=np.int64), [], np.empty((0, 0)), np.empty((0, 0), dtype=bool))
+        period_keys = np.array(sorted({row[0] for row in rows}), dtype=np.int64)
+        metric_names = dict(sorted({(row[1], row[2]) for row in rows}))
+        metric_ids = list(metric_names)
+        values = np.full((len(period_keys), len(metric_ids)), np.nan)
+        present = np.zeros(values.shape, dtype=bool)
+        period_idx = np.searchsorted(period_keys, [row[0] for row in rows])
+        metric_idx = np.searchsorted(metric_ids, [row[1] for row in rows])
+        values[period_idx, metric_idx] = [np.nan if row[3] is None else row[3] for row in rows]
+        present[period_idx, metric_idx] = True
+        return cls(period_keys, [metric_names[i] for i in metric_ids], values, present)
+
+    def before(self, cutoff_key):
+        """The history restricted to periods strictly before cutoff_key (a view, no copy)."""
+        end = int(np.searchsorted(self.period_keys, cutoff_key, side="left"))
+        history = TickerHistory(self.period_keys[:end], self.metrics, self.values[:end], self.present[:end])
+        history.loaded_at = self.loaded_at
+        return history
+
+    def to_dict(self):
+        """Nested {quarter label: {metric: value}} dict, oldest quarter first."""
+        data = {}
+        for key, row_values, row_present in zip(self.period_keys.tolist(), self.values.tolist(), self.present.tolist()):
+            data[schema.period_label(key)] = {
+                metric: (value if value == value else None)
+                for metric, value, exists in zip(self.metrics, row_values, row_present) if exists
+            }
+        return data
+
+
+# Histories are loaded once per ticker and reused until that ticker is written (see
+# invalidate_history) or, to pick up writes from other processes, after HISTORY_CACHE_TTL seconds
+HISTORY_CACHE_TTL = 300
+_history_cache = {}
+_history_lock = threading.Lock()
+
+
+def load_ticker_history(ticker):
+    """Return the cached TickerHistory for a ticker, reading it from the database on a miss."""
+    ticker = ticker.upper()
+    history = _history_cache.get(ticker)
+    if history is not None and time.monotonic() - history.loaded_at < HISTORY_CACHE_TTL:
+        return history
+    cursor = connection.get_connection(finance_db).cursor()
+    cursor.execute('''
+        SELECT f.period_key, f.metric_id, m.name, f.value
+        FROM financials f
+        JOIN metrics m ON m.metric_id = f.metric_id
+        WHERE f.ticker = ?
+    ''', (ticker,))
+    history = TickerHistory.from_rows(cursor.fetchall())
+    with _history_lock:
+        _history_cache[ticker] = history
+    return history
+
+
+def invalidate_history(tickers=None):
+    """Drop cached histories for the given ticker(s), or all of them; call after writing financials."""
+    with _history_lock:
+        if tickers is None:
+            _history_cache.clear()
+            return
+        if isinstance(tickers, str):
+            tickers = [tickers]
+        for ticker in tickers:
+            _history_cache.pop(ticker.upper(), None)
+
 
 def extract_ticker_data(ticker, period):
     """
@@ -100,62 +187,201 @@ def extract_ticker_data(ticker, period):
     if not period or not isinstance(period, str):
         return {}
     
-    # Parse cutoff quarter & year
-    try:
-        parts = period.split()
-        if len(parts) != 2:
-            return {}
-        
-        cutoff_q_str, cutoff_year_str = parts
-        
-        # Validate quarter format
-        if not cutoff_q_str.startswith('Q') or len(cutoff_q_str) != 2:
-            return {}
-        
-        cutoff_year = int(cutoff_year_str)
-        cutoff_q = int(cutoff_q_str.lstrip("Q"))
-        
-        # Validate quarter number
-        if cutoff_q < 1 or cutoff_q > 4:
-            return {}
-            
-    except (ValueError, AttributeError):
+    # Parse cutoff quarter & year into its integer period key
+    cutoff_key = schema.period_key(period)
+    if cutoff_key is None:
         return {}
 
-    # Open and query
+    # Serve from the in-process history cache; only a miss touches the database
     try:
         # Check if database file exists
         if not os.path.exists(finance_db):
             return {}
-            
-        conn = sqlite3.connect(finance_db)
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT quarter, metric, value FROM financials WHERE ticker = ?",
-            (ticker.upper(),)
-        )
-        rows = cursor.fetchall()
-        conn.close()
+
+        history = load_ticker_history(ticker)
     except (sqlite3.Error, Exception):
         return {}
 
-    # Filter & structure
-    data: dict[str, dict[str, float]] = {}
-    for quarter_str, metric, value in rows:
-        # parse each row’s quarter/year
-        try:
-            [q_str, year_str] = quarter_str.split()
-            year = int(year_str)
-            q = int(q_str.lstrip("Q"))
-        except ValueError:
-            # skip any malformed entries
-            continue
-
-        # include only if (year < cutoff_year) or (same year but q < cutoff_q)
-        if (year < cutoff_year) or (year == cutoff_year and q < cutoff_q):
-            data.setdefault(quarter_str, {})[metric] = value
-
-    return data
+    # Structure by quarter label, oldest first
+    return history.before(cutoff_key).to_dict()
+
+
+def extract_anomaly_stats(ticker, period):
+    """
+    Reads what anomaly detection needs for a ticker as of a cutoff period, without its raw history.
+
+    Args:
+        ticker (str): Company ticker symbol (e.g. "AAPL").
+        period (str): Cutoff period, formatted "Q<1–4> YYYY"; same "strictly before" rule as extract_ticker_data.
+
+    Returns:
+        tuple | None: (current_key, current, stats, has_history), or None if there is no data.
+            current_key is the latest quarter before the cutoff and current its {metric: value};
+            stats maps each metric to its stored totals over all earlier quarters
+            (see src.database.anomalyStats); has_history is False if there is no earlier quarter.
+    """
+    cutoff_key = schema.period_key(period) if isinstance(period, str) else None
+    if cutoff_key is None or not os.path.exists(finance_db):
+        return None
+    ticker = ticker.upper()
+    try:
+        conn = connection.get_connection(finance_db)
+        keys = [row[0] for row in conn.execute('''
+            SELECT DISTINCT period_key FROM financials
+            WHERE ticker = ? AND period_key < ?
+            ORDER BY period_key DESC LIMIT 2
+        ''', (ticker, cutoff_key))]
+        if not keys:
+            return None
+        current = dict(conn.execute('''
+            SELECT m.name, f.value
+            FROM financials f
+            JOIN metrics m ON m.metric_id = f.metric_id
+            WHERE f.ticker = ? AND f.period_key = ?
+        ''', (ticker, keys[0])).fetchall())
+        stats = anomalyStats.stats_before(conn, ticker, keys[0])
+    except sqlite3.Error:
+        return None
+    return keys[0], current, stats, len(keys) > 1
+
+
+def data_version(ticker, period):
+    """
+    Fingerprint of the financials anomaly detection reads for a ticker before a cutoff period.
+
+    Changes whenever a quarter before the cutoff is added, removed or restated, so cached analyses
+    built from the old data are not served once the database has moved on.
+
+    Returns:
+        str | None: "<latest period_key>:<row count>:<sum of values>", or None if it cannot be read.
+    """
+    cutoff_key = schema.period_key(period) if isinstance(period, str) else None
+    if cutoff_key is None or not os.path.exists(finance_db):
+        return None
+    try:
+        latest, count, total = connection.get_connection(finance_db).execute('''
+            SELECT MAX(period_key), COUNT(value), TOTAL(value) FROM financials
+            WHERE ticker = ? AND period_key < ?
+        ''', (ticker.upper(), cutoff_key)).fetchone()
+    except sqlite3.Error:
+        return None
+    return f"{latest}:{count}:{total!r}"
+
+
+def _query_financials(tickers, max_cutoff_key):
+    """
+    One indexed query for all financials of the given tickers (None = every ticker) strictly before max_cutoff_key.
+    Returns a long DataFrame with columns ticker, period_key, metric, value.
+    """
+    conn = connection.get_connection(finance_db)
+    if tickers is None:
+        rows = conn.execute(
+            "SELECT ticker, period_key, metric_id, value FROM financials WHERE period_key < ?", (max_cutoff_key,)
+        ).fetchall()
+    else:
+        tickers = sorted({ticker.upper() for ticker in tickers})
+        rows = []
+        # Stay well below SQLite's bound-parameter limit
+        for start in range(0, len(tickers), 500):
+            chunk = tickers[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows.extend(conn.execute(f'''
+                SELECT ticker, period_key, metric_id, value
+                FROM financials
+                WHERE ticker IN ({placeholders}) AND period_key < ?
+            ''', (*chunk, max_cutoff_key)).fetchall())
+    if not rows:
+        return pd.DataFrame(columns=["ticker", "period_key", "metric", "value"])
+
+    # Build the columns directly and resolve metric names once per metric rather than once per row
+    table = np.array(rows, dtype=object)
+    names = dict(conn.execute("SELECT metric_id, name FROM metrics"))
+    metric_ids, metric_idx = np.unique(table[:, 2].astype(np.int64), return_inverse=True)
+    return pd.DataFrame({
+        "ticker": table[:, 0],
+        "period_key": table[:, 1].astype(np.int64),
+        "metric": np.array([names[metric_id] for metric_id in metric_ids.tolist()], dtype=object)[metric_idx],
+        "value": table[:, 3].astype(float),
+    })
+
+
+def _to_wide(long):
+    """Pivot long rows to one row per (ticker, period_key) and one column per metric, sorted chronologically."""
+    # (ticker, period_key, metric) is the primary key, so there is exactly one value per cell
+    wide = long.pivot(index=["ticker", "period_key"], columns="metric", values="value").astype(float)
+    wide.columns.name = None
+    return wide.sort_index()
+
+
+def extract_panel(tickers, period):
+    """
+    Extracts financial data for many tickers strictly before one cutoff period, in a single query.
+
+    Args:
+        tickers (list[str] | None): Company ticker symbols, or None for every ticker in the database.
+        period (str): Cutoff period, formatted "Q<1–4> YYYY"; same "strictly before" rule as extract_ticker_data.
+
+    Returns:
+        pandas.DataFrame: One row per (ticker, period_key), one float column per metric (NaN where missing).
+            Rows are sorted by ticker and then chronologically; schema.period_label turns keys into labels.
+            Tickers without data are absent; an invalid period gives an empty frame.
+    """
+    panels = extract_panels(tickers, [period])
+    if panels.empty:
+        return panels.droplevel("cutoff")
+    return panels.xs(period, level="cutoff")
+
+
+def extract_panels(tickers, periods):
+    """
+    Extracts financial data for many tickers as of many cutoff periods (e.g. a backtest), in a single query.
+
+    Args:
+        tickers (list[str] | None): Company ticker symbols, or None for every ticker in the database.
+        periods (list[str]): Cutoff periods, formatted "Q<1–4> YYYY". Invalid periods are skipped.
+
+    Returns:
+        pandas.DataFrame: Indexed by (cutoff, ticker, period_key) with one float column per metric.
+            For each cutoff, only quarters strictly before it are included, exactly as extract_ticker_data.
+    """
+    cutoffs = {}
+    for period in periods:
+        key = schema.period_key(period) if isinstance(period, str) else None
+        if key is not None:
+            cutoffs[period] = key
+    empty = pd.DataFrame(index=pd.MultiIndex.from_arrays([[], [], []], names=["cutoff", "ticker", "period_key"]))
+    if not cutoffs or (tickers is not None and not tickers) or not os.path.exists(finance_db):
+        return empty
+
+    try:
+        long = _query_financials(tickers, max(cutoffs.values()))
+    except (sqlite3.Error, Exception):
+        return empty
+    if long.empty:
+        return empty
+
+    wide = _to_wide(long)
+    period_keys = wide.index.get_level_values("period_key").to_numpy()
+    # One boolean mask per cutoff over the shared frame
+    panels = {period: wide[period_keys < key] for period, key in cutoffs.items()}
+    return pd.concat(panels, names=["cutoff"])
+
+
+def panel_to_array(panel):
+    """
+    Convert an extract_panel frame to a dense NumPy panel.
+
+    Returns:
+        (values, tickers, period_keys, metrics): values has shape (tickers, periods, metrics) with NaN
+        where a ticker has no value for a period/metric.
+    """
+    tickers = panel.index.get_level_values("ticker").unique().sort_values()
+    period_keys = panel.index.get_level_values("period_key").unique().sort_values()
+    full = panel.reindex(pd.MultiIndex.from_product([tickers, period_keys], names=["ticker", "period_key"]))
+    values = full.to_numpy(dtype=float).reshape(len(tickers), len(period_keys), len(panel.columns))
+    return values, list(tickers), period_keys.to_numpy(), list(panel.columns)
+
+
 def main():
     global conn, cursor
     # conn = sqlite3.connect(finance_db)
@@ -0,0 +1,157 @@
+"""
+Content-addressed store of parsed reports, so the same PDF is never parsed twice.
+
+Entries are keyed by the SHA-256 of the PDF bytes, so renamed copies and re-uploads by other
+analysts hit the same entry, and hold the validated fileParser.Output as JSON. Every entry
+records the schema version it was parsed under (a hash of the output schema and the parser's
+prompt); looking a document up under a different version misses, so changing the schema in
+fileParser invalidates old entries without any manual step. Unlike the LLM response cache,
+entries do not expire: a parse depends only on the document bytes.
+
+The store lives in util/database/parse_store.db. It can be switched off with
+PARSE_STORE_DISABLED=1, and refresh_cache() blocks parse the document again and overwrite it.
+
+Usage:
+    python -m src.data.parseStore             # show entry counts per schema version
+    python -m src.data.parseStore --purge     # drop entries of other schema versions
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Optional, Type
+
+from pydantic import BaseModel
+
+from src.utils.llmCache import refreshing
+
+# Get the project root directory (3 levels up from src/data/)
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+parse_store_db = os.path.join(project_root, "util", "database", "parse_store.db")
+
+
+def store_enabled() -> bool:
+    """The store can be switched off with PARSE_STORE_DISABLED=1."""
+    return os.getenv("PARSE_STORE_DISABLED", "").lower() not in ("1", "true", "yes")
+
+
+def pdf_digest(data: bytes) -> str:
+    """Content address of a document."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def schema_version(output_type: Type[BaseModel], *extra: Any) -> str:
+    """Short hash of an output schema plus anything else that shapes the parse (e.g. the system prompt)."""
+    payload = json.dumps([output_type.model_json_schema(), *extra], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class ParseStore:
+    """SQLite-backed map from (document digest, schema version) to a parsed output. One connection is kept per thread."""
+
+    def __init__(self, path: str = parse_store_db):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS parsed_reports (
+                    digest TEXT PRIMARY KEY,
+                    schema_version TEXT NOT NULL,
+                    output TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_accessed REAL NOT NULL
+                )
+            ''')
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    def get(self, digest: str, version: str, output_type: Type[BaseModel]) -> Optional[BaseModel]:
+        """The stored output of a document under a schema version, or None when missing or stale."""
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT output FROM parsed_reports WHERE digest = ? AND schema_version = ?", (digest, version)
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE parsed_reports SET last_accessed = ? WHERE digest = ?", (time.time(), digest))
+        conn.commit()
+        return output_type.model_validate_json(row[0])
+
+    def put(self, digest: str, version: str, output: BaseModel) -> None:
+        """
+        Store a document's output, replacing any entry parsed under another schema version.
+        Unset (None) fields are left out so they fall back to their defaults when read back.
+        """
+        now = time.time()
+        conn = self._connection()
+        conn.execute('''
+            INSERT OR REPLACE INTO parsed_reports
+            (digest, schema_version, output, created_at, last_accessed)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (digest, version, output.model_dump_json(exclude_none=True), now, now))
+        conn.commit()
+
+    def versions(self) -> dict:
+        """Number of entries per schema version."""
+        rows = self._connection().execute(
+            "SELECT schema_version, COUNT(*) FROM parsed_reports GROUP BY schema_version"
+        ).fetchall()
+        return dict(rows)
+
+    def purge(self, keep_version: str) -> int:
+        """Delete entries of every other schema version. Returns the number removed."""
+        conn = self._connection()
+        removed = conn.execute("DELETE FROM parsed_reports WHERE schema_version != ?", (keep_version,)).rowcount
+        conn.commit()
+        return removed
+
+
+parse_store = ParseStore()
+
+
+async def parse_once(data: bytes, version: str, output_type: Type[BaseModel], parse) -> BaseModel:
+    """
+    Return the stored output for a document, or run parse() (a coroutine function returning the
+    validated output) and store its result.
+    """
+    if not store_enabled():
+        return await parse()
+    digest = pdf_digest(data)
+    if not refreshing():
+        stored = parse_store.get(digest, version, output_type)
+        if stored is not None:
+            return stored
+    output = await parse()
+    parse_store.put(digest, version, output)
+    return output
+
+
+def main(argv=None):
+    """Main function for command-line usage."""
+    from src.data.fileParser import SCHEMA_VERSION
+
+    parser = argparse.ArgumentParser(description="Inspect or clean the parsed report store.")
+    parser.add_argument("--purge", action="store_true", help="Drop entries of other schema versions")
+    args = parser.parse_args(argv)
+
+    if args.purge:
+        print(f"Removed {parse_store.purge(SCHEMA_VERSION)} stale entries.")
+    for version, count in parse_store.versions().items():
+        marker = " (current)" if version == SCHEMA_VERSION else ""
+        print(f"{version}: {count} documents{marker}")
+
+
+if __name__ == "__main__":
+    main()
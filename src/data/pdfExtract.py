@@ -0,0 +1,195 @@
+"""
+Local pre-extraction of PDF reports, so the extraction agents get text instead of the whole binary.
+
+pypdf pulls the text of every page, and each page is scored for financial statement and analyst
+rating content. Only the relevant pages go to the agent: cover pages, disclaimers and appendices
+of long broker reports are dropped. Table-like rows (a label followed by figures) of the selected
+pages are re-read in layout mode and appended as "label | value | ..." lines, so the model sees
+the columns together rather than pypdf's column-by-column text. Column header lines naming periods
+("Metric | Q2 FY2025 | Q3 FY2025 (E)") are kept as well, and every row records the period heading
+its first value column, so callers can tell quarterly figures from TTM or annual ones.
+
+When the text is unreliable, the caller falls back to sending the full PDF. That is the case when
+the text layer is missing or thin (scanned reports), when the file cannot be read, or when no page
+looks like financial content.
+"""
+
+import io
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from pypdf import PdfReader
+from pydantic_ai import BinaryContent
+
+# Pages with less text than this on average are treated as scanned (no usable text layer)
+MIN_CHARS_PER_PAGE = 200
+# Reports up to this many pages are sent whole (as text); selection only pays off on long reports
+SHORT_REPORT_PAGES = 3
+# Upper bound on the pages sent from one report
+MAX_SELECTED_PAGES = 12
+# Minimum score for a page (beyond the first) to be selected
+MIN_PAGE_SCORE = 3.0
+
+_financial_terms = re.compile(
+    r"\b(revenue|net income|ebitda|ebit|eps|earnings per share|operating (income|margin)|profit margin|"
+    r"gross margin|net margin|dividend|shares outstanding|income statement|balance sheet|cash flow|"
+    r"free cash flow|guidance|fiscal|quarter|q[1-4]|fy\d{2,4})\b",
+    re.IGNORECASE,
+)
+_rating_terms = re.compile(
+    r"\b(price target|target price|pt|rating|recommendation|buy|sell|hold|overweight|underweight|"
+    r"outperform|underperform|neutral|upside|downside|valuation)\b",
+    re.IGNORECASE,
+)
+_boilerplate_terms = re.compile(
+    r"\b(disclaimer|disclosures?|analyst certification|conflicts? of interest|not an offer|"
+    r"past performance|regulated by|for professional investors|all rights reserved)\b",
+    re.IGNORECASE,
+)
+_number = re.compile(r"^[(+\-−$€£¥]*\d[\d,.]*%?\)?(\s*(billion|million|thousand|bn|mn|[bmk]))?$", re.IGNORECASE)
+_cell_split = re.compile(r"\s{2,}")
+_figure_start = re.compile(r"^[(+\-−$€£¥]*\d")
+# Column headings of a table's period columns, e.g. "Q2 FY2025", "Q3 2025 (E)", "FY2024", "TTM"
+_period_heading = re.compile(
+    r"^((Q[1-4]|[1-4]Q|H[12]|FY|CY)\s*(FY)?\s*'?\d{2,4}|\d{4}|TTM|LTM)(\s*\([EAFP]\)|[EAFP])?$", re.IGNORECASE
+)
+
+
+@dataclass
+class PageText:
+    """Text of one page (1-based number) with its relevance score and table-like rows."""
+    number: int
+    text: str
+    score: float = 0.0
+    table_rows: List[str] = field(default_factory=list)
+    # Heading of the first value column of each table row (None when its table has no period headings)
+    row_periods: List[Optional[str]] = field(default_factory=list)
+
+
+@dataclass
+class PdfExtraction:
+    """Outcome of pre-extraction: the pages to send, or confident=False with the reason to send the PDF instead."""
+    page_count: int
+    pages: List[PageText]
+    confident: bool
+    reason: str
+
+    def as_text(self) -> str:
+        """The selected pages as one prompt string."""
+        numbers = ", ".join(str(page.number) for page in self.pages)
+        parts = [f"Text extracted from pages {numbers} of a {self.page_count}-page PDF report."]
+        for page in self.pages:
+            parts.append(f"--- Page {page.number} ---\n{page.text.strip()}")
+            if page.table_rows:
+                parts.append("Table rows (columns separated by |):\n" + "\n".join(page.table_rows))
+        return "\n\n".join(parts)
+
+
+def score_page(text: str) -> float:
+    """Relevance of a page: financial terms, rating terms (weighted double) and figures, minus boilerplate."""
+    tokens = text.split()
+    if not tokens:
+        return 0.0
+    financial = len({match.group(0).lower() for match in _financial_terms.finditer(text)})
+    rating = len({match.group(0).lower() for match in _rating_terms.finditer(text)})
+    boilerplate = len({match.group(0).lower() for match in _boilerplate_terms.finditer(text)})
+    figures = sum(1 for token in tokens if _number.match(token)) / len(tokens)
+    return financial + 2 * rating + 10 * figures - 2 * boilerplate
+
+
+def table_rows(layout_text: str) -> Tuple[List[str], List[Optional[str]]]:
+    """
+    Rows of a layout-mode page that look like table rows: a text label followed by figures, or by the
+    period headings of the columns below it. The row ends at the first cell that is not a figure,
+    which is usually a neighbouring text column.
+    Returns the rows and, for each row, the heading of its first value column: the first heading of
+    the nearest heading line above it, as long as no prose comes in between.
+    """
+    rows, periods = [], []
+    heading = None
+    for line in layout_text.splitlines():
+        cells = [cell.strip() for cell in _cell_split.split(line.strip()) if cell.strip()]
+        if not cells:
+            continue
+        headings = []
+        for cell in cells[1:]:
+            if not _period_heading.match(cell):
+                break
+            headings.append(cell)
+        if headings:
+            heading = headings[0]
+            rows.append(" | ".join([cells[0], *headings]))
+            periods.append(None)
+            continue
+        if len(cells) < 2 or _number.match(cells[0]):
+            heading = None
+            continue
+        values = []
+        for cell in cells[1:]:
+            if not _number.match(cell):
+                break
+            values.append(cell)
+        if values:
+            rows.append(" | ".join([cells[0], *values]))
+            periods.append(heading)
+        elif not _figure_start.match(cells[1]):
+            # Prose rather than a row with a qualified figure ("$0.96 annualized")
+            heading = None
+    return rows, periods
+
+
+def extract_pages(reader: PdfReader) -> List[PageText]:
+    """Plain text and score of every page."""
+    pages = []
+    for number, page in enumerate(reader.pages, start=1):
+        text = page.extract_text() or ""
+        pages.append(PageText(number=number, text=text, score=score_page(text)))
+    return pages
+
+
+def select_pages(pages: List[PageText], max_pages: int = MAX_SELECTED_PAGES) -> List[PageText]:
+    """The first page (ticker, period and headline rating) plus the highest-scoring pages, in page order."""
+    if len(pages) <= SHORT_REPORT_PAGES:
+        return list(pages)
+    candidates = sorted(
+        (page for page in pages[1:] if page.score >= MIN_PAGE_SCORE),
+        key=lambda page: page.score, reverse=True,
+    )[:max_pages - 1]
+    return sorted([pages[0], *candidates], key=lambda page: page.number)
+
+
+def extract_report(data: bytes, max_pages: int = MAX_SELECTED_PAGES) -> PdfExtraction:
+    """Extract the relevant pages of a PDF report, or explain why the full PDF should be sent instead."""
+    try:
+        reader = PdfReader(io.BytesIO(data))
+        if reader.is_encrypted:
+            reader.decrypt("")
+        pages = extract_pages(reader)
+    except Exception as e:
+        return PdfExtraction(0, [], False, f"could not read the PDF ({e})")
+
+    page_count = len(pages)
+    if not page_count:
+        return PdfExtraction(0, [], False, "the PDF has no pages")
+    if sum(len(page.text.strip()) for page in pages) / page_count < MIN_CHARS_PER_PAGE:
+        return PdfExtraction(page_count, [], False, "too little text (scanned or image-only PDF)")
+    if not any(_financial_terms.search(page.text) for page in pages):
+        return PdfExtraction(page_count, [], False, "no financial content found in the text")
+
+    selected = select_pages(pages, max_pages)
+    # Layout mode keeps table rows together; it is slower, so only selected pages are re-read
+    for page in selected:
+        try:
+            page.table_rows, page.row_periods = table_rows(reader.pages[page.number - 1].extract_text(extraction_mode="layout") or "")
+        except Exception:
+            page.table_rows, page.row_periods = [], []
+    return PdfExtraction(page_count, selected, True, f"sending {len(selected)} of {page_count} pages as text")
+
+
+def report_inputs(data: bytes, extraction: Optional[PdfExtraction] = None) -> list:
+    """Agent inputs for a PDF report: its extracted text when extraction is confident, otherwise the PDF itself."""
+    extraction = extraction or extract_report(data)
+    if extraction.confident:
+        return [extraction.as_text()]
+    return [BinaryContent(data=data, media_type='application/pdf')]
@@ -0,0 +1,252 @@
+"""
+Rule-based extraction of headline fields from the locally extracted text of a PDF report.
+
+Broker reports put their headline figures in predictable places: a metrics table ("Total Revenue |
+$97.8 billion | ..."), a price target box and a rating sentence. This module reads those with
+fixed rules and only keeps a value when it is unambiguous and carries the expected unit:
+
+- table rows (pdfExtract's "label | value | ..." lines): the first value of rows whose label names
+  a schema field, e.g. revenue or EBITDA margin. Only rows whose first value column is headed by
+  the report's quarter ("Q2 FY2025") are read; rows of tables without period headings, which are
+  often TTM or annual figures, are left to the model. Amounts must state their magnitude
+  ("billion", "B", ...), ratios must be percentages, and labels that match with different values
+  are dropped
+- ticker: "(NASDAQ: AAPL)" or a company name followed by "(AAPL)"
+- period: the quarter mentioned most often (estimate columns such as "Q3 2025 (E)" excluded)
+- sentiment: the rating of a "BUY recommendation" style sentence
+
+The result is a partial fileParser.Output as nested dicts; fileParser asks the model only for
+the fields that are still missing.
+"""
+
+import re
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple, Type
+
+from pydantic import BaseModel, create_model
+
+from src.data.pdfExtract import PdfExtraction
+
+# Bump when the rules change what they read, so parses stored under the old rules are redone (see fileParser.SCHEMA_VERSION)
+RULES_VERSION = 2
+
+# (field, kind, label pattern) for financialMetrics, matched against the whole table row label
+METRIC_RULES = [
+    ("totalrevenue", "amount", r"(total )?(revenues?|net sales|total sales)"),
+    ("revenuegrowth", "ratio", r"(total )?revenue growth( \(yoy\))?( %)?"),
+    ("ebitda", "amount", r"(adjusted )?ebitda"),
+    ("ebitdamargins", "ratio", r"(adjusted )?ebitda margin( %)?"),
+    ("netincome", "amount", r"net (income|profit|earnings)"),
+    ("profitmargin", "ratio", r"(net )?profit margin( %)?|net margin( %)?"),
+    ("operatingmargin", "ratio", r"(operating|ebit) margin( %)?"),
+    ("basiceps", "per_share", r"(basic )?(eps|earnings? per share)"),
+    ("sharesoutstanding", "amount", r"(basic )?(avg\.? |average )?shares outs(tanding|\.)?"),
+    ("dividendrate", "per_share", r"dividend (rate|per share)|dps"),
+    ("dividendyield", "ratio", r"dividend yield( %)?"),
+]
+PRICE_TARGET_LABEL = re.compile(r"\b(price target|target price|pt)\b", re.IGNORECASE)
+# Price targets of someone other than the report's analyst
+OTHER_TARGET_LABEL = re.compile(r"\b(external|bloomberg|consensus|street)\b", re.IGNORECASE)
+UPSIDE_LABEL = re.compile(r"^(upside|downside|upside/downside)( \(.*\))?$", re.IGNORECASE)
+
+SENTIMENTS = {
+    "buy": "Bullish", "strong buy": "Bullish", "overweight": "Bullish", "outperform": "Bullish",
+    "accumulate": "Bullish", "hold": "Neutral", "neutral": "Neutral", "market perform": "Neutral",
+    "equal weight": "Neutral", "sell": "Bearish", "strong sell": "Bearish", "underweight": "Bearish",
+    "underperform": "Bearish", "reduce": "Bearish",
+}
+
+_figure = re.compile(
+    r"^(?P<open>\()?(?P<sign>[+\-−])?\s*(?P<currency>[$€£¥])?\s*(?P<number>\d[\d,]*(\.\d+)?)\s*"
+    r"(?P<percent>%)?\s*(?P<unit>trillion|billion|million|thousand|tn|bn|mn|[tbmk])?(?P<close>\))?$",
+    re.IGNORECASE,
+)
+_units = {
+    "trillion": 1e12, "tn": 1e12, "t": 1e12, "billion": 1e9, "bn": 1e9, "b": 1e9,
+    "million": 1e6, "mn": 1e6, "m": 1e6, "thousand": 1e3, "k": 1e3,
+}
+_label_rules = [(field, kind, re.compile(rf"^({pattern})$", re.IGNORECASE)) for field, kind, pattern in METRIC_RULES]
+_ticker_exchange = re.compile(r"\b(?:NASDAQ|NYSE|NYSE American|AMEX|LSE|TSX)\s*:\s*([A-Z]{1,5}(?:\.[A-Z])?)\b")
+_ticker_company = re.compile(r"\b(?:Inc|Corp|Corporation|Ltd|Co|plc|Group|Holdings)\.?,?\s*\(([A-Z]{1,5}(?:\.[A-Z])?)\)")
+_quarter = re.compile(r"\bQ([1-4])\s*[-‑–]?\s*(?:FY\s*)?(20\d{2})\b(?!\s*\(?E\b)")
+_rating = re.compile(
+    r"\b(strong buy|strong sell|buy|sell|hold|overweight|underweight|outperform|underperform|neutral|"
+    r"accumulate|reduce|market perform|equal weight)\s+(recommendation|rating)\b|"
+    r"\b(?:rating|recommendation)\s*:\s*(strong buy|strong sell|buy|sell|hold|overweight|underweight|"
+    r"outperform|underperform|neutral|accumulate|reduce)\b",
+    re.IGNORECASE,
+)
+
+
+def parse_figure(cell: str, kind: str, label: str = "") -> Optional[float]:
+    """
+    Value of a table cell if it has the unit expected for kind, otherwise None.
+    amount: money or counts with a magnitude ("$97.8 billion", "16.4 B"); ratio: a percentage as a
+    decimal ("+3.2%" -> 0.032, or a bare number under a "%" label); per_share: a plain price ("$1.49").
+    """
+    match = _figure.match(cell.strip())
+    if not match or bool(match.group("open")) != bool(match.group("close")):
+        return None
+    value = float(match.group("number").replace(",", ""))
+    if match.group("sign") in ("-", "−") or match.group("open"):
+        value = -value
+    unit = (match.group("unit") or "").lower()
+    if kind == "amount":
+        if match.group("percent") or not unit:
+            return None
+        return value * _units[unit]
+    if kind == "ratio":
+        if match.group("currency") or unit or not (match.group("percent") or "%" in label):
+            return None
+        return round(value / 100, 10)
+    if kind == "per_share":
+        if match.group("percent") or unit:
+            return None
+        return value
+    raise ValueError(f"Unknown figure kind: {kind}")
+
+
+def _split_row(row: str) -> Tuple[str, List[str]]:
+    label, *values = [cell.strip() for cell in row.split("|")]
+    return label, values
+
+
+def quarterly_heading(heading: Optional[str], period: Optional[Tuple[int, int]]) -> bool:
+    """Whether a column heading names an actual (not estimated) quarter, and the report's quarter if it is known."""
+    match = _quarter.fullmatch(heading.strip()) if heading else None
+    if not match:
+        return False
+    return period is None or (int(match.group(1)), int(match.group(2))) == period
+
+
+def extract_metrics(rows: List[str], row_periods: List[Optional[str]],
+                    period: Optional[Tuple[int, int]] = None) -> Tuple[Dict[str, float], Dict[str, str]]:
+    """
+    financialMetrics values and price target/upside cells read from table rows.
+    Metrics are only read from rows under a quarterly column heading (see quarterly_heading);
+    a field whose matching rows disagree is left out.
+    """
+    candidates: Dict[str, set] = {}
+    analyst: Dict[str, str] = {}
+    targets, upsides = set(), set()
+    previous_was_target = False
+    for row, heading in zip(rows, row_periods):
+        label, values = _split_row(row)
+        if not values:
+            continue
+        first = values[0]
+        is_target = bool(PRICE_TARGET_LABEL.search(label)) and not OTHER_TARGET_LABEL.search(label)
+        if is_target and parse_figure(first, "per_share") is not None:
+            targets.add(first)
+        elif UPSIDE_LABEL.match(label) and parse_figure(first, "ratio") is not None:
+            # An upside row directly under the analyst's own price target belongs to it
+            if previous_was_target:
+                analyst["upside"] = first
+            upsides.add(first)
+        quarterly = quarterly_heading(heading, period)
+        for field, kind, pattern in _label_rules:
+            if quarterly and pattern.match(label):
+                value = parse_figure(first, kind, label)
+                if value is not None:
+                    candidates.setdefault(field, set()).add(value)
+        previous_was_target = is_target
+
+    if len(targets) == 1:
+        analyst["priceTarget"] = targets.pop()
+    if "upside" not in analyst and len(upsides) == 1:
+        analyst["upside"] = upsides.pop()
+    metrics = {field: values.pop() for field, values in candidates.items() if len(values) == 1}
+    for field in ("totalrevenue", "ebitda", "netincome", "sharesoutstanding"):
+        if field in metrics:
+            metrics[field] = int(round(metrics[field]))
+    return metrics, analyst
+
+
+def extract_ticker(text: str) -> Optional[str]:
+    """The ticker named in the text, if exactly one is found."""
+    tickers = set(_ticker_exchange.findall(text)) | set(_ticker_company.findall(text))
+    return tickers.pop() if len(tickers) == 1 else None
+
+
+def extract_period(text: str) -> Optional[Tuple[int, int]]:
+    """(quarter, year) of the quarter mentioned most often (at least twice, without a tie)."""
+    counts = Counter((int(quarter), int(year)) for quarter, year in _quarter.findall(text)).most_common(2)
+    if not counts or counts[0][1] < 2 or (len(counts) > 1 and counts[1][1] == counts[0][1]):
+        return None
+    return counts[0][0]
+
+
+def extract_sentiment(text: str) -> Optional[str]:
+    """Bullish, Neutral or Bearish from the report's rating, if it states exactly one."""
+    ratings = {SENTIMENTS[(match.group(1) or match.group(3)).lower()] for match in _rating.finditer(text)}
+    return ratings.pop() if len(ratings) == 1 else None
+
+
+def extract_fields(extraction: PdfExtraction) -> Dict:
+    """Fields of fileParser.Output found by the rules, as nested dicts (absent fields are left out)."""
+    if not extraction.confident:
+        return {}
+    text = "\n".join(page.text for page in extraction.pages)
+    rows = [row for page in extraction.pages for row in page.table_rows]
+    row_periods = [heading for page in extraction.pages for heading in page.row_periods]
+
+    period = extract_period(text)
+    metrics, analyst = extract_metrics(rows, row_periods, period)
+    found: Dict = {}
+    ticker = extract_ticker(text)
+    if ticker:
+        found["ticker"] = metrics["ticker"] = ticker
+    if period:
+        quarter, year = period
+        found["period"] = f"Q{quarter} {year}"
+        metrics["quarter"], metrics["year"] = quarter, year
+    sentiment = extract_sentiment(text)
+    if sentiment:
+        analyst["sentiment"] = sentiment
+    if metrics:
+        found["financialMetrics"] = metrics
+    if analyst:
+        found["analyst"] = analyst
+    return found
+
+
+def missing_fields(model: Type[BaseModel], found: Dict, prefix: str = "") -> Tuple[str, ...]:
+    """Dotted paths of the model's fields (nested models expanded) that found does not cover."""
+    missing = []
+    for name, info in model.model_fields.items():
+        annotation = info.annotation
+        if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+            missing += missing_fields(annotation, found.get(name, {}), f"{prefix}{name}.")
+        elif name not in found:
+            missing.append(prefix + name)
+    return tuple(missing)
+
+
+@lru_cache(maxsize=None)
+def remaining_model(model: Type[BaseModel], missing: Tuple[str, ...]) -> Type[BaseModel]:
+    """
+    A copy of model with only the missing fields (dotted paths), keeping their types and descriptions.
+    Built once per combination, so agents and cache keys for the same gaps are reused.
+    """
+    fields = {}
+    for name, info in model.model_fields.items():
+        annotation = info.annotation
+        if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+            nested = tuple(path.split(".", 1)[1] for path in missing if path.startswith(name + "."))
+            if nested:
+                fields[name] = (remaining_model(annotation, nested), info)
+        elif name in missing:
+            fields[name] = (annotation, info)
+    return create_model(f"Remaining{model.__name__}", **fields)
+
+
+def merge_fields(found: Dict, filled: Dict) -> Dict:
+    """Combine rule values with the model's answer for the remaining fields (rule values win)."""
+    merged = dict(filled)
+    for name, value in found.items():
+        if isinstance(value, dict):
+            merged[name] = merge_fields(value, merged.get(name) or {})
+        else:
+            merged[name] = value
+    return merged
@@ -4,10 +4,11 @@ It takes a dictionary containing financial metrics and inserts them into the dat
 """
 
 import os
-import sqlite3
 import yfinance as yf
 import streamlit as st
 from datetime import datetime
+from src.data import dbextract
+from src.database import connection, schema
 
 expected_output = {
     "ticker": "AAPL",
@@ -26,23 +27,81 @@ expected_output = {
 }
 
 def update_db_from_dict(data):
-    finance_db = "util/database/finance.db"
-    conn = sqlite3.connect(finance_db)
-    cursor = conn.cursor()  
-    # Insert financial data
-    for metric, value in data.items():
-        if metric != "ticker" and metric != "quarter":
-            year = data.get("year")
-            quarter = data.get("quarter")
-            if quarter != None and year is not None:
-                quarter_label = f"Q{quarter} {year}"
-                cursor.execute('''
-                    INSERT INTO financials (ticker, quarter, metric, value)
-                    VALUES (?, ?, ?, ?)
-                ''', (data["ticker"], quarter_label, metric, value))
-
-    conn.commit()
-    conn.close()
+    # Upsert financial data; re-running for the same quarter overwrites instead of duplicating
+    year = data.get("year")
+    quarter = data.get("quarter")
+    if quarter != None and year is not None:
+        quarter_label = f"Q{quarter} {year}"
+        rows = [
+            (data["ticker"], quarter_label, metric, value)
+            for metric, value in data.items()
+            if metric not in ("ticker", "quarter", "year")
+        ]
+        with connection.transaction() as conn:
+            schema.upsert_financials(conn, rows)
+        dbextract.invalidate_history(data["ticker"])
+
+
+# Value columns of each analysis table; rows are keyed by UNIQUE(ticker, quarter, analyst_name)
+ANALYSIS_COLUMNS = {
+    "financial_analysis": [
+        "price_target", "analyst_summary", "performance_summary", "investment_outlook",
+        "expected_values_future_quarters", "risk_assessment",
+    ],
+    "sentiment_analysis": ["analyst_sentiment", "market_sentiment"],
+    "leadership_analysis": ["stability_assessment", "investor_implications", "overall_impact"],
+}
+
+_upsert_statements = {}
+
+
+def _upsert_statement(table):
+    """INSERT ... ON CONFLICT DO UPDATE for an analysis table (built once per table)."""
+    statement = _upsert_statements.get(table)
+    if statement is None:
+        columns = ANALYSIS_COLUMNS[table]
+        placeholders = ", ".join("?" * (len(columns) + 3))
+        updates = ", ".join(f"{column} = excluded.{column}" for column in columns)
+        statement = f'''
+            INSERT INTO {table} (ticker, quarter, analyst_name, {", ".join(columns)})
+            VALUES ({placeholders})
+            ON CONFLICT (ticker, quarter, analyst_name) DO UPDATE SET
+                {updates}, updated_at = CURRENT_TIMESTAMP
+        '''
+        _upsert_statements[table] = statement
+    return statement
+
+
+def _analysis_row(table, ticker, quarter, data):
+    """Turn one analysis dictionary into a row tuple for the upsert statement."""
+    # Validate analyst_name is not null
+    analyst_name = data.get('analyst_name')
+    if not analyst_name or analyst_name.strip() == '':
+        analyst_name = 'Analyst A'  # Default fallback
+        data['analyst_name'] = analyst_name
+    return (ticker, quarter, analyst_name, *(data.get(column) for column in ANALYSIS_COLUMNS[table]))
+
+
+def _write_analysis(conn, table, rows):
+    """Upsert (ticker, quarter, data) rows into an analysis table with one executemany."""
+    conn.executemany(_upsert_statement(table), [
+        _analysis_row(table, ticker, quarter, data) for ticker, quarter, data in rows
+    ])
+
+
+def upsert_analysis(table, rows):
+    """
+    Insert or update many rows of one analysis table in a single transaction.
+
+    Args:
+        table: 'financial_analysis', 'sentiment_analysis' or 'leadership_analysis'
+        rows: Iterable of (ticker, quarter, data) where data holds analyst_name and the table's columns
+    """
+    rows = list(rows)
+    if not rows:
+        return
+    with connection.transaction() as conn:
+        _write_analysis(conn, table, rows)
 
 
 def update_financial_analysis(ticker, quarter, financial_analysis_data):
@@ -61,61 +120,7 @@ def update_financial_analysis(ticker, quarter, financial_analysis_data):
             - expected_values_future_quarters: str
             - risk_assessment: str
     """
-    # Validate analyst_name is not null
-    analyst_name = financial_analysis_data.get('analyst_name')
-    if not analyst_name or analyst_name.strip() == '':
-        analyst_name = 'Analyst A'  # Default fallback
-        financial_analysis_data['analyst_name'] = analyst_name
-    
-    finance_db = "util/database/finance.db"
-    conn = sqlite3.connect(finance_db)
-    cursor = conn.cursor()
-    
-    # Check if record exists (considering analyst_name as well)
-    cursor.execute('''
-        SELECT id FROM financial_analysis 
-        WHERE ticker = ? AND quarter = ? AND analyst_name = ?
-    ''', (ticker, quarter, financial_analysis_data.get('analyst_name')))
-    
-    existing_record = cursor.fetchone()
-    
-    if existing_record:
-        # Update existing record
-        cursor.execute('''
-            UPDATE financial_analysis 
-            SET price_target = ?, analyst_summary = ?, performance_summary = ?, 
-                investment_outlook = ?, expected_values_future_quarters = ?, 
-                risk_assessment = ?, updated_at = CURRENT_TIMESTAMP
-            WHERE ticker = ? AND quarter = ? AND analyst_name = ?
-        ''', (
-            financial_analysis_data.get('price_target'),
-            financial_analysis_data.get('analyst_summary'),
-            financial_analysis_data.get('performance_summary'),
-            financial_analysis_data.get('investment_outlook'),
-            financial_analysis_data.get('expected_values_future_quarters'),
-            financial_analysis_data.get('risk_assessment'),
-            ticker, quarter, financial_analysis_data.get('analyst_name')
-        ))
-    else:
-        # Insert new record
-        cursor.execute('''
-            INSERT INTO financial_analysis 
-            (ticker, quarter, analyst_name, price_target, analyst_summary, performance_summary, 
-             investment_outlook, expected_values_future_quarters, risk_assessment)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            ticker, quarter,
-            financial_analysis_data.get('analyst_name'),
-            financial_analysis_data.get('price_target'),
-            financial_analysis_data.get('analyst_summary'),
-            financial_analysis_data.get('performance_summary'),
-            financial_analysis_data.get('investment_outlook'),
-            financial_analysis_data.get('expected_values_future_quarters'),
-            financial_analysis_data.get('risk_assessment')
-        ))
-    
-    conn.commit()
-    conn.close()
+    upsert_analysis("financial_analysis", [(ticker, quarter, financial_analysis_data)])
 
 
 def update_sentiment_analysis(ticker, quarter, sentiment_data):
@@ -130,51 +135,7 @@ def update_sentiment_analysis(ticker, quarter, sentiment_data):
             - analyst_sentiment: str
             - market_sentiment: str
     """
-    # Validate analyst_name is not null
-    analyst_name = sentiment_data.get('analyst_name')
-    if not analyst_name or analyst_name.strip() == '':
-        analyst_name = 'Analyst A'  # Default fallback
-        sentiment_data['analyst_name'] = analyst_name
-    
-    finance_db = "util/database/finance.db"
-    conn = sqlite3.connect(finance_db)
-    cursor = conn.cursor()
-    
-    # Check if record exists (considering analyst_name as well)
-    cursor.execute('''
-        SELECT id FROM sentiment_analysis 
-        WHERE ticker = ? AND quarter = ? AND analyst_name = ?
-    ''', (ticker, quarter, sentiment_data.get('analyst_name')))
-    
-    existing_record = cursor.fetchone()
-    
-    if existing_record:
-        # Update existing record
-        cursor.execute('''
-            UPDATE sentiment_analysis 
-            SET analyst_sentiment = ?, market_sentiment = ?, 
-                updated_at = CURRENT_TIMESTAMP
-            WHERE ticker = ? AND quarter = ? AND analyst_name = ?
-        ''', (
-            sentiment_data.get('analyst_sentiment'),
-            sentiment_data.get('market_sentiment'),
-            ticker, quarter, sentiment_data.get('analyst_name')
-        ))
-    else:
-        # Insert new record
-        cursor.execute('''
-            INSERT INTO sentiment_analysis 
-            (ticker, quarter, analyst_name, analyst_sentiment, market_sentiment)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (
-            ticker, quarter,
-            sentiment_data.get('analyst_name'),
-            sentiment_data.get('analyst_sentiment'),
-            sentiment_data.get('market_sentiment')
-        ))
-    
-    conn.commit()
-    conn.close()
+    upsert_analysis("sentiment_analysis", [(ticker, quarter, sentiment_data)])
 
 
 def update_leadership_analysis(ticker, quarter, leadership_data):
@@ -190,53 +151,35 @@ def update_leadership_analysis(ticker, quarter, leadership_data):
             - investor_implications: str
             - overall_impact: str
     """
-    # Validate analyst_name is not null
-    analyst_name = leadership_data.get('analyst_name')
-    if not analyst_name or analyst_name.strip() == '':
-        analyst_name = 'Analyst A'  # Default fallback
-        leadership_data['analyst_name'] = analyst_name
-    
-    finance_db = "util/database/finance.db"
-    conn = sqlite3.connect(finance_db)
-    cursor = conn.cursor()
-    
-    # Check if record exists (considering analyst_name as well)
-    cursor.execute('''
-        SELECT id FROM leadership_analysis 
-        WHERE ticker = ? AND quarter = ? AND analyst_name = ?
-    ''', (ticker, quarter, leadership_data.get('analyst_name')))
-    
-    existing_record = cursor.fetchone()
-    
-    if existing_record:
-        # Update existing record
-        cursor.execute('''
-            UPDATE leadership_analysis 
-            SET stability_assessment = ?, investor_implications = ?, overall_impact = ?, 
-                updated_at = CURRENT_TIMESTAMP
-            WHERE ticker = ? AND quarter = ? AND analyst_name = ?
-        ''', (
-            leadership_data.get('stability_assessment'),
-            leadership_data.get('investor_implications'),
-            leadership_data.get('overall_impact'),
-            ticker, quarter, leadership_data.get('analyst_name')
-        ))
-    else:
-        # Insert new record
-        cursor.execute('''
-            INSERT INTO leadership_analysis 
-            (ticker, quarter, analyst_name, stability_assessment, investor_implications, overall_impact)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (
-            ticker, quarter,
-            leadership_data.get('analyst_name'),
-            leadership_data.get('stability_assessment'),
-            leadership_data.get('investor_implications'),
-            leadership_data.get('overall_impact')
-        ))
-    
-    conn.commit()
-    conn.close()
+    upsert_analysis("leadership_analysis", [(ticker, quarter, leadership_data)])
+
+
+def update_analysis_batch(uploads):
+    """
+    Write the analysis rows of many uploads (e.g. a whole batch run) in a single transaction,
+    with one executemany per table.
+
+    Args:
+        uploads: Iterable of (ticker, quarter, financial_analysis_data, sentiment_data, leadership_data);
+            sections that are None are skipped.
+    """
+    rows = {table: [] for table in ANALYSIS_COLUMNS}
+    for ticker, quarter, financial_analysis_data, sentiment_data, leadership_data in uploads:
+        for table, data in zip(ANALYSIS_COLUMNS, (financial_analysis_data, sentiment_data, leadership_data)):
+            if data is not None:
+                rows[table].append((ticker, quarter, data))
+    with connection.transaction() as conn:
+        for table, table_rows in rows.items():
+            if table_rows:
+                _write_analysis(conn, table, table_rows)
+
+
+def update_analysis_results(ticker, quarter, financial_analysis_data=None, sentiment_data=None, leadership_data=None):
+    """
+    Write the financial, sentiment and leadership analysis rows for one upload in a single transaction.
+    Sections passed as None are skipped; either all given rows are written or none are.
+    """
+    update_analysis_batch([(ticker, quarter, financial_analysis_data, sentiment_data, leadership_data)])
 
 
 def main():
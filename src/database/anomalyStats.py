@@ -0,0 +1,156 @@
+"""
+Cumulative sufficient statistics of every financials series, so anomaly baselines for any cutoff
+are read from one stored row per metric instead of being recomputed from the raw history.
+
+For each (ticker, metric) series, anomaly_stats holds one row per observed quarter with running
+totals over all observations up to and including that quarter:
+
+    n, sum_y, sum_yy, sum_t, sum_tt, sum_ty      (t = period_key, y = value - shift)
+
+Values are shifted by the first value of the series (`shift`), which keeps the sums small and makes
+a constant series exactly zero-variance. Mean, variance and the least-squares line of any prefix of
+the history follow from a single row.
+
+schema.upsert_financials keeps the table current: writing a quarter recomputes the totals from that
+quarter onward, so appending the newest quarter costs O(1) per metric. Restated or back-filled
+quarters recompute only the rows after them.
+
+Usage:
+    python -m src.database.anomalyStats [path/to/finance.db]    # rebuild from financials
+"""
+
+import sqlite3
+import sys
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+STAT_COLUMNS = ["n", "shift", "sum_y", "sum_yy", "sum_t", "sum_tt", "sum_ty"]
+
+
+def create_stats_table(conn: sqlite3.Connection) -> None:
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS anomaly_stats (
+            ticker TEXT NOT NULL,
+            metric_id INTEGER NOT NULL REFERENCES metrics(metric_id),
+            period_key INTEGER NOT NULL,
+            n INTEGER NOT NULL,
+            shift REAL NOT NULL,
+            sum_y REAL NOT NULL,
+            sum_yy REAL NOT NULL,
+            sum_t REAL NOT NULL,
+            sum_tt REAL NOT NULL,
+            sum_ty REAL NOT NULL,
+            PRIMARY KEY (ticker, metric_id, period_key)
+        ) WITHOUT ROWID
+    ''')
+
+
+def _accumulate(observations: Iterable[Tuple[int, float]], previous: Optional[Sequence] = None) -> Iterator[Tuple]:
+    """Yield (period_key, n, shift, sum_y, sum_yy, sum_t, sum_tt, sum_ty) after each observation, continuing previous."""
+    if previous is None:
+        n, shift, sum_y, sum_yy, sum_t, sum_tt, sum_ty = 0, None, 0.0, 0.0, 0.0, 0.0, 0.0
+    else:
+        n, shift, sum_y, sum_yy, sum_t, sum_tt, sum_ty = previous
+    for key, value in observations:
+        if shift is None:
+            shift = value
+        y = value - shift
+        n += 1
+        sum_y += y
+        sum_yy += y * y
+        sum_t += key
+        sum_tt += key * key
+        sum_ty += key * y
+        yield key, n, shift, sum_y, sum_yy, sum_t, sum_tt, sum_ty
+
+
+def _insert(conn: sqlite3.Connection, ticker: str, metric_id: int, rows: Iterable[Tuple]) -> None:
+    conn.executemany(
+        f"INSERT INTO anomaly_stats (ticker, metric_id, period_key, {', '.join(STAT_COLUMNS)}) "
+        f"VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [(ticker, metric_id, *row) for row in rows]
+    )
+
+
+def refresh_stats(conn: sqlite3.Connection, changes: Iterable[Tuple[str, int, int]]) -> None:
+    """
+    Bring anomaly_stats up to date after (ticker, metric_id, period_key) financials rows were written.
+    Each series is recomputed from its earliest changed quarter on, continuing the stored totals
+    before it. Runs inside the caller's transaction.
+    """
+    earliest: Dict[Tuple[str, int], int] = {}
+    for ticker, metric_id, key in changes:
+        series = (ticker, metric_id)
+        if series not in earliest or key < earliest[series]:
+            earliest[series] = key
+
+    for (ticker, metric_id), key in earliest.items():
+        previous = conn.execute(f'''
+            SELECT {', '.join(STAT_COLUMNS)} FROM anomaly_stats
+            WHERE ticker = ? AND metric_id = ? AND period_key < ?
+            ORDER BY period_key DESC LIMIT 1
+        ''', (ticker, metric_id, key)).fetchone()
+        conn.execute(
+            "DELETE FROM anomaly_stats WHERE ticker = ? AND metric_id = ? AND period_key >= ?",
+            (ticker, metric_id, key)
+        )
+        observations = conn.execute('''
+            SELECT period_key, value FROM financials
+            WHERE ticker = ? AND metric_id = ? AND period_key >= ? AND value IS NOT NULL
+            ORDER BY period_key
+        ''', (ticker, metric_id, key)).fetchall()
+        _insert(conn, ticker, metric_id, _accumulate(observations, previous))
+
+
+def rebuild_stats(conn: sqlite3.Connection) -> int:
+    """Recompute the whole anomaly_stats table from financials. Returns the number of series."""
+    conn.execute("DELETE FROM anomaly_stats")
+    rows = conn.execute('''
+        SELECT ticker, metric_id, period_key, value FROM financials
+        WHERE value IS NOT NULL
+        ORDER BY ticker, metric_id, period_key
+    ''')
+    series_count = 0
+    current: Optional[Tuple[str, int]] = None
+    observations: List[Tuple[int, float]] = []
+    for ticker, metric_id, key, value in rows:
+        if (ticker, metric_id) != current:
+            if current is not None:
+                _insert(conn, *current, _accumulate(observations))
+                series_count += 1
+            current, observations = (ticker, metric_id), []
+        observations.append((key, value))
+    if current is not None:
+        _insert(conn, *current, _accumulate(observations))
+        series_count += 1
+    return series_count
+
+
+def stats_before(conn: sqlite3.Connection, ticker: str, before_key: int) -> Dict[str, Dict[str, float]]:
+    """
+    Totals over every observation of each metric strictly before before_key, keyed by metric name.
+    Metrics without an earlier observation are absent.
+    """
+    # SQLite takes the bare columns from the row holding MAX(period_key) in each group
+    rows = conn.execute(f'''
+        SELECT m.name, MAX(s.period_key), {', '.join('s.' + column for column in STAT_COLUMNS)}
+        FROM anomaly_stats s
+        JOIN metrics m ON m.metric_id = s.metric_id
+        WHERE s.ticker = ? AND s.period_key < ?
+        GROUP BY s.metric_id
+    ''', (ticker.upper(), before_key)).fetchall()
+    return {row[0]: dict(zip(STAT_COLUMNS, row[2:])) for row in rows}
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    """Rebuild the anomaly statistics of a finance.db file."""
+    from src.database.connection import FINANCE_DB, transaction
+
+    argv = sys.argv[1:] if argv is None else argv
+    path = argv[0] if argv else FINANCE_DB
+    with transaction(path) as conn:
+        series_count = rebuild_stats(conn)
+    print(f"{path}: rebuilt anomaly statistics for {series_count} series.")
+
+
+if __name__ == "__main__":
+    main()
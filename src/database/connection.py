@@ -0,0 +1,91 @@
+"""
+Shared SQLite access for finance.db.
+
+Every module reads and writes the database through this module, so there is one canonical path
+(util/database/finance.db under the project root, independent of the working directory) and one
+long-lived connection per thread instead of a connect/close per call. Connections use WAL
+journaling, so readers never block the writer, and a busy timeout, so concurrent batch workers
+wait for the write lock instead of failing with "database is locked". sqlite3 keeps a per-connection
+cache of prepared statements, which long-lived connections get to reuse.
+
+The committed finance.db is stored in WAL mode already, so setting the mode on connect does not
+rewrite the tracked file; the -wal/-shm files SQLite keeps next to it while connections are open
+are ignored by git.
+"""
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from src.database import schema
+
+# Get the project root directory (3 levels up from src/database/)
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+FINANCE_DB = os.path.join(project_root, "util", "database", "finance.db")
+
+# Seconds a writer waits for the lock held by another connection
+BUSY_TIMEOUT = 30
+# Prepared statements kept per connection
+CACHED_STATEMENTS = 256
+
+_local = threading.local()
+
+
+def configure_connection(conn: sqlite3.Connection) -> None:
+    """WAL journaling, fewer fsyncs and a larger page cache."""
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-65536")  # 64 MB
+
+
+def _connections() -> Dict[str, sqlite3.Connection]:
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    return connections
+
+
+def get_connection(path: str = FINANCE_DB) -> sqlite3.Connection:
+    """Return this thread's connection to the database at path, opening and configuring it on first use."""
+    path = os.path.abspath(path)
+    connections = _connections()
+    conn = connections.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, cached_statements=CACHED_STATEMENTS)
+        configure_connection(conn)
+        schema.ensure_financials_schema(conn)
+        connections[path] = conn
+    return conn
+
+
+@contextmanager
+def transaction(path: str = FINANCE_DB) -> Iterator[sqlite3.Connection]:
+    """
+    Run a block of writes as one transaction on this thread's connection.
+    The write lock is taken up front (BEGIN IMMEDIATE) so concurrent writers queue on the busy
+    timeout instead of deadlocking. Nested blocks join the outer transaction.
+    """
+    conn = get_connection(path)
+    if conn.in_transaction:
+        yield conn
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
+def close_connection(path: Optional[str] = None) -> None:
+    """Close this thread's connection to path, or all of this thread's connections."""
+    connections = _connections()
+    paths = list(connections) if path is None else [os.path.abspath(path)]
+    for key in paths:
+        conn = connections.pop(key, None)
+        if conn is not None:
+            conn.close()
@@ -2,16 +2,24 @@
 Creates a SQLite database for financial metrics of various companies.
 This script fetches financial data from Yahoo Finance, processes it,
 and stores it in a structured format in the database.
+
+The database is updated incrementally: rows for each ticker are collected in memory and
+upserted with executemany in a single transaction, so new quarters are added and restated
+values are overwritten without rebuilding the file. Pass --rebuild to start from scratch.
+
+Raw data is downloaded first for all tickers in parallel (see fetchFinancials) and cached on disk,
+then the metrics are computed from the cached frames; --offline recomputes without network access.
 """
 
+import argparse
 import os
-import sqlite3
-import yfinance as yf
 import streamlit as st
+import numpy as np
 import pandas as pd
+from src.data import dbextract
+from src.database import connection, fetchFinancials, schema
 
-createdb_path = os.path.dirname(os.path.abspath(__file__))
-finance_db = os.path.join(createdb_path, "../../../util/database/finance.db")
+finance_db = connection.FINANCE_DB
 
 included_metrics = ["total revenue", #dollars
                    "basic eps", #dollars
@@ -33,16 +41,8 @@ quarters = ["Q1 2024", "Q2 2024", "Q3 2024", "Q4 2024", "Q1 2025"]
 
 
 def create_table_financials():
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS financials (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            ticker TEXT,
-            quarter TEXT,
-            metric TEXT,
-            value REAL
-        )
-    ''')
-    conn.commit()
+    # Keyed financials + metrics tables; migrates databases that still use the text-quarter layout
+    schema.ensure_financials_schema(conn)
 
 
 def create_table_quarter():
@@ -52,11 +52,13 @@ def create_table_quarter():
             quarter TEXT NOT NULL
         )
     ''')
-    
-    for quarter in quarters:
-        cursor.execute('''
-            INSERT OR IGNORE INTO quarter (quarter) VALUES (?)
-        ''', (quarter,))
+    cursor.execute('''
+        DELETE FROM quarter WHERE id NOT IN (SELECT MIN(id) FROM quarter GROUP BY quarter)
+    ''')
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_quarter_quarter ON quarter (quarter)
+    ''')
+    insert_quarters(quarters)
     conn.commit()
 
 
@@ -122,138 +124,147 @@ def create_table_leadership_analysis():
     conn.commit()
 
 
-def insert_data(ticker, quarter, metric, value):
-    cursor.execute('''
-        INSERT INTO financials (ticker, quarter, metric, value)
-        VALUES (?, ?, ?, ?)
-    ''', (ticker, quarter, metric, value))
-    conn.commit()
+def insert_quarters(quarter_list):
+    cursor.executemany('''
+        INSERT INTO quarter (quarter)
+        SELECT ? WHERE NOT EXISTS (SELECT 1 FROM quarter WHERE quarter = ?)
+    ''', [(quarter, quarter) for quarter in quarter_list])
 
 
-def get_metric_value(df, metric_name, col):
-    """Helper function to get metric value from dataframe"""
-    for idx in df.index:
-        if idx.strip().lower() == metric_name.lower():
-            return df.loc[idx, col]
-    return None
+def insert_rows(rows):
+    """
+    Upsert (ticker, quarter, metric, value) rows in one transaction.
+    Existing values are overwritten, so restated figures replace the old ones.
+    """
+    with connection.transaction(finance_db):
+        schema.upsert_financials(conn, rows)
+        insert_quarters(sorted({row[1] for row in rows}))
+    dbextract.invalidate_history({row[0] for row in rows})
 
 
-def calculate_derived_metrics(ticker, df, dat):
-    """Calculate all derived metrics for each quarter"""
-    
-    # Get dividend data
-    dividends = dat.dividends
+# Metrics copied straight from the quarterly financials
+base_metrics = ["total revenue", "basic eps", "ebitda", "net income", "basic average shares"]
+
+# Metrics computed from the statement rows and dividends
+derived_metrics = ["dividend rate", "dividend yield", "revenue growth", "ebitda margin", "profit margin", "operating margin"]
+
+# Statement rows needed to compute all metrics
+source_metrics = base_metrics + ["gross profit", "operating income"]
+
+
+def normalize_financials(df):
+    """
+    Normalise the row labels of a quarterly_financials frame once (stripped, lower case; the first
+    row wins for duplicated labels) and return a {metric: values per quarter} dict of float arrays
+    for source_metrics, in the frame's column order (newest first). Missing rows are all NaN.
+    """
+    labels = df.index.astype(str).str.strip().str.lower()
+    keep = ~labels.duplicated(keep="first")
+    data = df[keep].set_axis(labels[keep], axis=0).reindex(source_metrics)
+    try:
+        values = data.to_numpy(dtype=float, na_value=np.nan)
+    except (TypeError, ValueError):
+        values = data.apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+    return dict(zip(source_metrics, values))
+
+
+def quarterly_dividends(dividends, quarter_keys):
+    """
+    Sum dividends per calendar quarter in one groupby and align the sums to quarter_keys
+    (year * 4 + quarter). Quarters without a payment are NaN.
+    """
+    if dividends is None or dividends.empty:
+        return np.full(len(quarter_keys), np.nan)
+    index = dividends.index
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    sums = dividends.groupby(index.year * 4 + index.quarter).sum()
+    return sums.reindex(quarter_keys).to_numpy(dtype=float)
+
+
+def calculate_derived_metrics(ticker, raw):
+    """
+    Calculate all metrics for every quarter at once from a raw fetchFinancials bundle.
+    Returns a long-format frame with columns ticker, quarter, metric, value, ready for bulk insert.
+    """
+    df = raw["quarterly_financials"]
+    values = normalize_financials(df)
+    dates = pd.DatetimeIndex(df.columns)
+    quarter_keys = dates.year * 4 + dates.quarter
+    quarter_labels = np.array([f"Q{q} {y}" for y, q in zip(dates.year, dates.quarter)], dtype=object)
     
-    # Get current price for dividend yield calculation
-    hist = dat.history(period="1d")
-    current_price = hist['Close'].iloc[-1] if not hist.empty else None
+    total_revenue = values["total revenue"]
+    current_price = raw["current_price"]
     
-    for col in df.columns:
-        quarter_str = f"Q{((col.month - 1) // 3) + 1} {col.year}"
-        
-        base_metrics = ["total revenue", "basic eps", "ebitda", "net income", "basic average shares"]
-        
-        for metric in base_metrics:
-            value = get_metric_value(df, metric, col)
-            if value is not None and pd.notna(value):
-                insert_data(ticker, quarter_str, metric, value)
-        
-        # Now calculate derived metrics
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # A zero denominator gives NaN, which drops the metric for that quarter
+        revenue = np.where(total_revenue != 0, total_revenue, np.nan)
         
-        # Get base values for calculations
-        total_revenue = get_metric_value(df, "total revenue", col)
-        ebitda = get_metric_value(df, "ebitda", col)
-        net_income = get_metric_value(df, "net income", col)
-        gross_profit = get_metric_value(df, "gross profit", col)
-        operating_income = get_metric_value(df, "operating income", col)
+        # Dividend rate (quarterly sum) and yield (annualised against the latest close)
+        dividend_rate = quarterly_dividends(raw["dividends"], quarter_keys)
+        if current_price is not None and current_price > 0:
+            dividend_yield = (dividend_rate * 4 / current_price) * 100
+        else:
+            dividend_yield = np.full(len(dates), np.nan)
         
-        # Dividend Rate and Dividend Yield
-        try:
-            # Calculate quarterly dividend from historical dividends
-            quarter_num = (col.month - 1) // 3 + 1
-            quarter_start = pd.Timestamp(col.year, (quarter_num - 1) * 3 + 1, 1)
-            quarter_end = quarter_start + pd.DateOffset(months=3) - pd.DateOffset(days=1)
-            
-            if not dividends.empty:
-                # Convert to timezone-naive for comparison
-                dividends_naive = dividends.copy()
-                if dividends_naive.index.tz is not None:
-                    dividends_naive.index = dividends_naive.index.tz_localize(None)
-                
-                # Get dividends paid in this quarter
-                quarter_dividends = dividends_naive[(dividends_naive.index >= quarter_start) & (dividends_naive.index <= quarter_end)]
-                
-                if not quarter_dividends.empty:
-                    # Sum of dividends in the quarter
-                    quarterly_dividend = quarter_dividends.sum()
-                    
-                    # Store quarterly dividend rate
-                    insert_data(ticker, quarter_str, "dividend rate", quarterly_dividend)
-                    
-                    # Calculate dividend yield based on annualized dividend
-                    if current_price is not None and current_price > 0:
-                        annualized_dividend = quarterly_dividend * 4
-                        dividend_yield = (annualized_dividend / current_price) * 100
-                        insert_data(ticker, quarter_str, "dividend yield", dividend_yield)
-        except Exception as e:
-            print(f"Error calculating dividends for {ticker} {quarter_str}: {e}")
+        # Revenue growth against the previous quarter (columns are in reverse chronological order)
+        prev_revenue = np.append(total_revenue[1:], np.nan)
+        revenue_growth = ((total_revenue - prev_revenue) / np.where(prev_revenue != 0, prev_revenue, np.nan)) * 100
         
-        # Revenue Growth
-        if total_revenue is not None and pd.notna(total_revenue):
-            # Get previous quarter's revenue
-            prev_col_idx = df.columns.get_loc(col) + 1  # Note: columns are in reverse chronological order
-            if prev_col_idx < len(df.columns):
-                prev_col = df.columns[prev_col_idx]
-                prev_revenue = get_metric_value(df, "total revenue", prev_col)
-                
-                if prev_revenue is not None and pd.notna(prev_revenue) and prev_revenue != 0:
-                    revenue_growth = ((total_revenue - prev_revenue) / prev_revenue) * 100
-                    insert_data(ticker, quarter_str, "revenue growth", revenue_growth)
-        
-        # EBITDA Margin
-        if ebitda is not None and total_revenue is not None:
-            if pd.notna(ebitda) and pd.notna(total_revenue) and total_revenue != 0:
-                ebitda_margin = (ebitda / total_revenue) * 100
-                insert_data(ticker, quarter_str, "ebitda margin", ebitda_margin)
-        
-        # Profit Margin
-        if gross_profit is not None and total_revenue is not None:
-            if pd.notna(gross_profit) and pd.notna(total_revenue) and total_revenue != 0:
-                profit_margin = (gross_profit / total_revenue) * 100
-                insert_data(ticker, quarter_str, "profit margin", profit_margin)
-        
-        # Operating Margin
-        if operating_income is not None and total_revenue is not None:
-            if pd.notna(operating_income) and pd.notna(total_revenue) and total_revenue != 0:
-                operating_margin = (operating_income / total_revenue) * 100
-                insert_data(ticker, quarter_str, "operating margin", operating_margin)
+        # Margins
+        ebitda_margin = (values["ebitda"] / revenue) * 100
+        profit_margin = (values["gross profit"] / revenue) * 100
+        operating_margin = (values["operating income"] / revenue) * 100
+    
+    # metrics x quarters; one long-format row per non-missing cell
+    matrix = np.vstack([values[metric] for metric in base_metrics] + [
+        dividend_rate, dividend_yield, revenue_growth, ebitda_margin, profit_margin, operating_margin,
+    ])
+    present = ~np.isnan(matrix)
+    metric_idx, quarter_idx = np.nonzero(present)
+    return pd.DataFrame({
+        "ticker": ticker,
+        "quarter": quarter_labels[quarter_idx],
+        "metric": np.array(base_metrics + derived_metrics, dtype=object)[metric_idx],
+        "value": matrix[present],
+    })
 
 
-def fill_db(ticker):
-    dat = yf.Ticker(ticker)
-    df = dat.quarterly_financials
+def fill_db(ticker, raw):
+    df = raw["quarterly_financials"]
     
     if df.empty:
         print(f"No financial data found for {ticker}.")
-        return
+        return 0
     
-    # Calculate and insert all metrics
-    calculate_derived_metrics(ticker, df, dat)
-    
-    conn.commit()
+    # Calculate all metrics for the ticker, then write them in a single transaction
+    metrics = calculate_derived_metrics(ticker, raw)
+    insert_rows(list(metrics.itertuples(index=False, name=None)))
+    return len(metrics)
 
 
 db_exists = os.path.exists(finance_db)
 
 
-def main():
+def main(argv=None):
     global conn, cursor
+
+    parser = argparse.ArgumentParser(description="Create or update the financial metrics database.")
+    parser.add_argument("tickers", nargs="*", default=tickers, help="Tickers to load (default: the built-in list)")
+    parser.add_argument("--rebuild", action="store_true", help="Delete the existing database and rebuild it from scratch")
+    parser.add_argument("--concurrency", type=int, default=fetchFinancials.DEFAULT_CONCURRENCY, help="Number of tickers fetched at the same time")
+    parser.add_argument("--retries", type=int, default=fetchFinancials.DEFAULT_RETRIES, help="Retries per ticker (exponential backoff)")
+    parser.add_argument("--refresh", action="store_true", help="Ignore the raw cache and download everything again")
+    parser.add_argument("--offline", action="store_true", help="Only use the raw cache; no network requests")
+    args = parser.parse_args(argv)
     
-    if os.path.exists(finance_db):
-        os.remove(finance_db)
+    if args.rebuild and os.path.exists(finance_db):
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(finance_db + suffix):
+                os.remove(finance_db + suffix)
         print("Old database deleted.")
     
-    conn = sqlite3.connect(finance_db)
+    conn = connection.get_connection(finance_db)
     cursor = conn.cursor()
     create_table_quarter()
     create_table_financials()
@@ -261,14 +272,25 @@ def main():
     create_table_sentiment_analysis()
     create_table_leadership_analysis()
     
-    for ticker in tickers:
+    # Fetch stage: all tickers in parallel, bounded by the slowest download
+    raw_data = fetchFinancials.fetch_tickers(
+        args.tickers,
+        concurrency=args.concurrency,
+        retries=args.retries,
+        max_age=0 if args.refresh else fetchFinancials.RAW_CACHE_MAX_AGE,
+        offline=args.offline,
+    )
+    
+    # Compute stage: purely local, one transaction per ticker
+    for ticker, raw in raw_data.items():
         print(f"Processing {ticker}...")
-        fill_db(ticker)
+        count = fill_db(ticker, raw)
+        print(f"Upserted {count} rows for {ticker}.")
     
     # Print summary of what was inserted
     cursor.execute('''
         SELECT ticker, metric, COUNT(*) as count
-        FROM financials
+        FROM financial_metrics
         GROUP BY ticker, metric
         ORDER BY ticker, metric
     ''')
@@ -277,7 +299,7 @@ def main():
     for row in cursor.fetchall():
         print(f"{row[0]} - {row[1]}: {row[2]} quarters")
     
-    conn.close()
+    connection.close_connection(finance_db)
 
 
 if __name__ == "__main__":
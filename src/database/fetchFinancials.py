@@ -0,0 +1,129 @@
+"""
+Fetch stage for createDb: downloads the raw Yahoo Finance data for many tickers in parallel.
+
+Each ticker is fetched on a thread pool with retries and exponential backoff. The raw frames
+(quarterly financials, dividends and the latest close) are pickled under util/database/raw_cache,
+so the metric calculations in createDb can be re-run offline without touching the network.
+"""
+
+import os
+import pickle
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterable, Optional
+
+import pandas as pd
+import yfinance as yf
+
+# Get the project root directory (3 levels up from src/database/)
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+raw_cache_dir = os.path.join(project_root, "util", "database", "raw_cache")
+
+# Raw data younger than this is reused instead of fetched again
+RAW_CACHE_MAX_AGE = 12 * 60 * 60
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 1.0
+
+
+def raw_cache_path(ticker: str) -> str:
+    return os.path.join(raw_cache_dir, f"{ticker.upper()}.pkl")
+
+
+def save_raw(raw: Dict[str, Any]) -> str:
+    """Pickle a raw bundle to the cache directory (atomically) and return its path."""
+    os.makedirs(raw_cache_dir, exist_ok=True)
+    path = raw_cache_path(raw["ticker"])
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(raw, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_raw(ticker: str, max_age: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """
+    Load the cached raw bundle for a ticker.
+    Returns None if there is none, or if it is older than max_age seconds (None = any age).
+    """
+    path = raw_cache_path(ticker)
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        raw = pickle.load(f)
+    if max_age is not None and time.time() - raw.get("fetched_at", 0) > max_age:
+        return None
+    return raw
+
+
+def fetch_ticker(ticker: str, retries: int = DEFAULT_RETRIES, backoff: float = DEFAULT_BACKOFF) -> Dict[str, Any]:
+    """
+    Download the raw data for one ticker.
+    Retries failed requests with exponential backoff (backoff, 2*backoff, ... plus jitter).
+
+    Returns a bundle with keys: ticker, quarterly_financials, dividends, current_price, fetched_at.
+    """
+    attempt = 0
+    while True:
+        try:
+            dat = yf.Ticker(ticker)
+            df = dat.quarterly_financials
+            dividends = dat.dividends
+            hist = dat.history(period="1d")
+            current_price = float(hist['Close'].iloc[-1]) if not hist.empty else None
+            return {
+                "ticker": ticker,
+                "quarterly_financials": df if df is not None else pd.DataFrame(),
+                "dividends": dividends if dividends is not None else pd.Series(dtype=float),
+                "current_price": current_price,
+                "fetched_at": time.time(),
+            }
+        except Exception as e:
+            if attempt >= retries:
+                raise
+            delay = backoff * (2 ** attempt) + random.uniform(0, backoff)
+            attempt += 1
+            print(f"Fetching {ticker} failed ({e}); retry {attempt}/{retries} in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def fetch_tickers(ticker_list: Iterable[str], concurrency: int = DEFAULT_CONCURRENCY, retries: int = DEFAULT_RETRIES,
+                  backoff: float = DEFAULT_BACKOFF, max_age: Optional[float] = RAW_CACHE_MAX_AGE,
+                  offline: bool = False) -> Dict[str, Dict[str, Any]]:
+    """
+    Fetch the raw bundles for many tickers concurrently and store them in the raw cache.
+
+    Cached bundles younger than max_age are reused (max_age=0 forces a fresh download).
+    With offline=True only the cache is read, whatever its age.
+    Tickers that could not be fetched are reported and left out of the result.
+    """
+    ticker_list = list(dict.fromkeys(ticker_list))
+    results: Dict[str, Dict[str, Any]] = {}
+
+    to_fetch = []
+    for ticker in ticker_list:
+        raw = load_raw(ticker, max_age=None if offline else max_age)
+        if raw is not None:
+            results[ticker] = raw
+        elif offline:
+            print(f"No cached data for {ticker}; skipping (offline).")
+        else:
+            to_fetch.append(ticker)
+
+    if to_fetch:
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            futures = {executor.submit(fetch_ticker, ticker, retries, backoff): ticker for ticker in to_fetch}
+            for future in as_completed(futures):
+                ticker = futures[future]
+                try:
+                    raw = future.result()
+                except Exception as e:
+                    print(f"Failed to fetch {ticker}: {e}")
+                    continue
+                save_raw(raw)
+                results[ticker] = raw
+
+    # Preserve the requested ticker order
+    return {ticker: results[ticker] for ticker in ticker_list if ticker in results}
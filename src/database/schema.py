@@ -0,0 +1,195 @@
+"""
+Schema of the financials table and its migration.
+
+Periods are stored as a sortable integer key (year * 4 + quarter, so Q1 2024 -> 8097) and metric
+names live in a `metrics` lookup table. The primary key (ticker, period_key, metric_id) gives one
+value per ticker, quarter and metric, and lets cutoff filtering and ordering use index range scans:
+
+    SELECT ... FROM financials WHERE ticker = ? AND period_key < ? ORDER BY period_key
+
+Older databases (financials with a free-text `quarter` and `metric` column) are migrated in place
+by ensure_financials_schema(); the `financial_metrics` view shows the table with readable labels.
+Writes through upsert_financials also keep the anomaly_stats aggregates (see anomalyStats) current.
+
+Usage:
+    python -m src.database.schema [path/to/finance.db]
+"""
+
+import re
+import sqlite3
+import sys
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+from src.database import anomalyStats
+
+# Bumped whenever the financials schema changes (stored in PRAGMA user_version)
+# 1: keyed financials + metrics, 2: anomaly_stats
+SCHEMA_VERSION = 2
+
+_period_pattern = re.compile(r"^\s*Q([1-4])\s+(\d{4})\s*$")
+
+
+def period_key(period: str) -> Optional[int]:
+    """Convert a period label such as "Q3 2024" to its integer key, or None if it is malformed."""
+    if not isinstance(period, str):
+        return None
+    match = _period_pattern.match(period)
+    if not match:
+        return None
+    return int(match.group(2)) * 4 + int(match.group(1))
+
+
+def period_label(key: int) -> str:
+    """Convert an integer period key back to its "Q<n> YYYY" label."""
+    year, quarter = divmod(key - 1, 4)
+    return f"Q{quarter + 1} {year}"
+
+
+def _columns(conn: sqlite3.Connection, table: str) -> Sequence[str]:
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def _create_tables(conn: sqlite3.Connection, financials_table: str = "financials") -> None:
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS metrics (
+            metric_id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        )
+    ''')
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {financials_table} (
+            ticker TEXT NOT NULL,
+            period_key INTEGER NOT NULL,
+            metric_id INTEGER NOT NULL REFERENCES metrics(metric_id),
+            value REAL,
+            PRIMARY KEY (ticker, period_key, metric_id)
+        ) WITHOUT ROWID
+    ''')
+
+
+def _create_view(conn: sqlite3.Connection) -> None:
+    conn.execute("DROP VIEW IF EXISTS financial_metrics")
+    conn.execute('''
+        CREATE VIEW financial_metrics AS
+        SELECT f.ticker,
+               'Q' || ((f.period_key - 1) % 4 + 1) || ' ' || ((f.period_key - 1) / 4) AS quarter,
+               f.period_key,
+               m.name AS metric,
+               f.value
+        FROM financials f
+        JOIN metrics m ON m.metric_id = f.metric_id
+    ''')
+
+
+def _migrate_legacy_financials(conn: sqlite3.Connection) -> int:
+    """
+    Rewrite a legacy financials(id, ticker, quarter, metric, value) table into the keyed schema.
+    Rows with an unparseable quarter are dropped; for duplicates the most recently inserted row wins.
+    Returns the number of migrated rows.
+    """
+    conn.create_function("period_key", 1, period_key, deterministic=True)
+    _create_tables(conn, "financials_migrated")
+    conn.execute('''
+        INSERT OR IGNORE INTO metrics (name)
+        SELECT DISTINCT lower(trim(metric)) FROM financials WHERE metric IS NOT NULL ORDER BY 1
+    ''')
+    conn.execute('''
+        INSERT OR REPLACE INTO financials_migrated (ticker, period_key, metric_id, value)
+        SELECT upper(trim(f.ticker)), period_key(f.quarter), m.metric_id, f.value
+        FROM financials f
+        JOIN metrics m ON m.name = lower(trim(f.metric))
+        WHERE f.ticker IS NOT NULL AND period_key(f.quarter) IS NOT NULL
+        ORDER BY f.id
+    ''')
+    migrated = conn.execute("SELECT COUNT(*) FROM financials_migrated").fetchone()[0]
+    conn.execute("DROP VIEW IF EXISTS financial_metrics")
+    conn.execute("DROP TABLE financials")
+    conn.execute("ALTER TABLE financials_migrated RENAME TO financials")
+    return migrated
+
+
+def ensure_financials_schema(conn: sqlite3.Connection) -> None:
+    """
+    Create the metrics/financials tables, migrating a legacy financials table if there is one.
+    Cheap to call on every connection once the database is at SCHEMA_VERSION.
+    """
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+        return
+    if conn.in_transaction:
+        conn.commit()
+    # One write transaction for the whole migration, so concurrent processes cannot both migrate
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version < SCHEMA_VERSION:
+            if "quarter" in _columns(conn, "financials"):
+                migrated = _migrate_legacy_financials(conn)
+                print(f"Migrated {migrated} financials rows to the keyed schema.")
+            _create_tables(conn)
+            _create_view(conn)
+            anomalyStats.create_stats_table(conn)
+            if version < 2:
+                series_count = anomalyStats.rebuild_stats(conn)
+                if series_count:
+                    print(f"Built anomaly statistics for {series_count} series.")
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def metric_ids(conn: sqlite3.Connection, names: Iterable[str]) -> Dict[str, int]:
+    """Return {name: metric_id} for the given metric names, registering any new ones."""
+    names = sorted({name.strip().lower() for name in names})
+    conn.executemany("INSERT OR IGNORE INTO metrics (name) VALUES (?)", [(name,) for name in names])
+    ids: Dict[str, int] = {}
+    # Stay well below SQLite's bound-parameter limit
+    for start in range(0, len(names), 500):
+        chunk = names[start:start + 500]
+        placeholders = ",".join("?" * len(chunk))
+        ids.update(conn.execute(
+            f"SELECT name, metric_id FROM metrics WHERE name IN ({placeholders})", chunk
+        ).fetchall())
+    return ids
+
+
+def upsert_financials(conn: sqlite3.Connection, rows: Iterable[Tuple[str, str, str, float]]) -> int:
+    """
+    Upsert (ticker, quarter label, metric name, value) rows with a single executemany and update
+    the anomaly statistics of the affected series.
+    Rows with a malformed quarter label are skipped. Runs inside the caller's transaction.
+    Returns the number of rows written.
+    """
+    rows = list(rows)
+    ids = metric_ids(conn, (row[2] for row in rows))
+    keyed = []
+    for ticker, quarter, metric, value in rows:
+        key = period_key(quarter)
+        if key is None:
+            continue
+        keyed.append((ticker.upper(), key, ids[metric.strip().lower()], value))
+    conn.executemany('''
+        INSERT INTO financials (ticker, period_key, metric_id, value)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT (ticker, period_key, metric_id) DO UPDATE SET value = excluded.value
+    ''', keyed)
+    anomalyStats.refresh_stats(conn, ((ticker, metric_id, key) for ticker, key, metric_id, _ in keyed))
+    return len(keyed)
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    """Migrate a finance.db file to the current schema."""
+    from src.database.connection import FINANCE_DB
+
+    argv = sys.argv[1:] if argv is None else argv
+    path = argv[0] if argv else FINANCE_DB
+    conn = sqlite3.connect(path)
+    ensure_financials_schema(conn)
+    count = conn.execute("SELECT COUNT(*) FROM financials").fetchone()[0]
+    print(f"{path}: schema version {SCHEMA_VERSION}, {count} financials rows.")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
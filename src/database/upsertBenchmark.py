@@ -0,0 +1,172 @@
+"""
+Benchmark for writing analysis rows: the original SELECT-then-UPDATE/INSERT path versus native upserts.
+
+Each variant writes N uploads (one financial, sentiment and leadership row each) into its own
+temporary copy of the analysis tables, first as fresh inserts and then again as updates of the
+same keys, and reports rows per second:
+
+- legacy:     per row, open a connection, SELECT id, then UPDATE or INSERT, commit and close
+              (what updateDb did before; rollback journal)
+- per-upload: update_analysis_results-style upsert, one transaction per upload (WAL)
+- bulk:       update_analysis_batch-style upsert, one executemany per table in one transaction (WAL)
+
+Usage:
+    python -m src.database.upsertBenchmark --uploads 10000
+"""
+
+import argparse
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from typing import Callable, Dict, List, Tuple
+
+from src.data import updateDb
+from src.database import connection
+
+ANALYSIS_TABLES = list(updateDb.ANALYSIS_COLUMNS)
+
+
+def copy_schema_source(directory: str) -> str:
+    """Copy the live finance.db into directory, so the benchmark never opens the tracked database itself."""
+    path = os.path.join(directory, "schema_source.db")
+    shutil.copyfile(connection.FINANCE_DB, path)
+    return path
+
+
+def create_analysis_tables(path: str, source_path: str) -> None:
+    """Create empty analysis tables at path, using the DDL of the database at source_path (a copy of finance.db)."""
+    source = sqlite3.connect(source_path)
+    placeholders = ",".join("?" * len(ANALYSIS_TABLES))
+    ddl = [row[0] for row in source.execute(
+        f"SELECT sql FROM sqlite_master WHERE type = 'table' AND name IN ({placeholders})", ANALYSIS_TABLES
+    )]
+    source.close()
+    conn = sqlite3.connect(path)
+    for statement in ddl:
+        conn.execute(statement)
+    conn.commit()
+    conn.close()
+
+
+def make_uploads(count: int, revision: int) -> List[Tuple]:
+    """Synthetic uploads spread over tickers, quarters and analysts; revision changes the values."""
+    uploads = []
+    for i in range(count):
+        ticker = f"T{i % 500:03d}"
+        quarter = f"Q{i % 4 + 1} {2000 + (i // 2000)}"
+        analyst = f"Analyst {(i // 4) % 4}"
+        uploads.append((
+            ticker, quarter,
+            {'analyst_name': analyst, 'price_target': 100.0 + revision, 'analyst_summary': f"summary {revision}",
+             'performance_summary': "performance", 'investment_outlook': "Hold",
+             'expected_values_future_quarters': "n/a", 'risk_assessment': "Risk Level: Medium"},
+            {'analyst_name': analyst, 'analyst_sentiment': f"Neutral {revision}", 'market_sentiment': "Neutral"},
+            {'analyst_name': analyst, 'stability_assessment': "7", 'investor_implications': f"rev {revision}",
+             'overall_impact': "Neutral"},
+        ))
+    return uploads
+
+
+def legacy_write(path: str, uploads: List[Tuple]) -> None:
+    """The original path: a connection, a SELECT and an UPDATE or INSERT plus a commit per row."""
+    for ticker, quarter, *sections in uploads:
+        for table, data in zip(ANALYSIS_TABLES, sections):
+            columns = updateDb.ANALYSIS_COLUMNS[table]
+            values = [data.get(column) for column in columns]
+            conn = sqlite3.connect(path)
+            cursor = conn.cursor()
+            cursor.execute(
+                f"SELECT id FROM {table} WHERE ticker = ? AND quarter = ? AND analyst_name = ?",
+                (ticker, quarter, data['analyst_name'])
+            )
+            if cursor.fetchone():
+                assignments = ", ".join(f"{column} = ?" for column in columns)
+                cursor.execute(
+                    f"UPDATE {table} SET {assignments}, updated_at = CURRENT_TIMESTAMP "
+                    f"WHERE ticker = ? AND quarter = ? AND analyst_name = ?",
+                    (*values, ticker, quarter, data['analyst_name'])
+                )
+            else:
+                placeholders = ", ".join("?" * (len(columns) + 3))
+                cursor.execute(
+                    f"INSERT INTO {table} (ticker, quarter, analyst_name, {', '.join(columns)}) VALUES ({placeholders})",
+                    (ticker, quarter, data['analyst_name'], *values)
+                )
+            conn.commit()
+            conn.close()
+
+
+def per_upload_write(path: str, uploads: List[Tuple]) -> None:
+    """Native upsert with one transaction per upload on a shared connection."""
+    for ticker, quarter, *sections in uploads:
+        with connection.transaction(path) as conn:
+            for table, data in zip(ANALYSIS_TABLES, sections):
+                updateDb._write_analysis(conn, table, [(ticker, quarter, data)])
+
+
+def bulk_write(path: str, uploads: List[Tuple]) -> None:
+    """Native upsert of all uploads with one executemany per table in a single transaction."""
+    with connection.transaction(path) as conn:
+        for index, table in enumerate(ANALYSIS_TABLES):
+            updateDb._write_analysis(conn, table, [
+                (ticker, quarter, sections[index]) for ticker, quarter, *sections in uploads
+            ])
+
+
+VARIANTS: Dict[str, Callable[[str, List[Tuple]], None]] = {
+    "legacy": legacy_write,
+    "per-upload": per_upload_write,
+    "bulk": bulk_write,
+}
+
+
+def run_benchmark(upload_count: int, variants: List[str], directory: str) -> List[Dict]:
+    """Run each variant on a fresh database (insert pass, then update pass) and return timing rows."""
+    results = []
+    source_path = copy_schema_source(directory)
+    for name in variants:
+        path = os.path.join(directory, f"{name}.db")
+        create_analysis_tables(path, source_path)
+        for phase, revision in (("insert", 0), ("update", 1)):
+            uploads = make_uploads(upload_count, revision)
+            start = time.perf_counter()
+            VARIANTS[name](path, uploads)
+            seconds = time.perf_counter() - start
+            rows = upload_count * len(ANALYSIS_TABLES)
+            results.append({"variant": name, "phase": phase, "rows": rows,
+                            "seconds": round(seconds, 3), "rows_per_sec": round(rows / seconds)})
+        connection.close_connection(path)
+        # Every row must exist exactly once, carrying the values of the update pass
+        check = sqlite3.connect(path)
+        for table in ANALYSIS_TABLES:
+            count = check.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            assert count == upload_count, f"{name}: {table} has {count} rows, expected {upload_count}"
+        stale = check.execute("SELECT COUNT(*) FROM financial_analysis WHERE price_target != 101").fetchone()[0]
+        assert stale == 0, f"{name}: {stale} financial_analysis rows were not updated"
+        check.close()
+    return results
+
+
+def main(argv=None):
+    """Main function for command-line usage."""
+    parser = argparse.ArgumentParser(description="Benchmark analysis-table writes: legacy vs native upsert.")
+    parser.add_argument("--uploads", type=int, default=10000, help="Number of uploads (3 rows each)")
+    parser.add_argument("--variants", nargs="+", default=list(VARIANTS), choices=list(VARIANTS))
+    parser.add_argument("--dir", default=None, help="Directory for the temporary databases (default: system temp)")
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp(prefix="upsert_benchmark_", dir=args.dir)
+    try:
+        results = run_benchmark(args.uploads, args.variants, directory)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    print(f"{'variant':<12}{'phase':<8}{'rows':>8}{'seconds':>10}{'rows/sec':>12}")
+    for row in results:
+        print(f"{row['variant']:<12}{row['phase']:<8}{row['rows']:>8}{row['seconds']:>10}{row['rows_per_sec']:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,12 @@
 from pydantic_ai import Agent
-from pydantic_ai.models.gemini import GeminiModel
-from pydantic_ai.providers.google_gla import GoogleGLAProvider
-from pydantic_ai.common_tools.duckduckgo import duckduckgo_search_tool
-from pydantic_ai.common_tools.tavily import tavily_search_tool
+from src.search.searchTools import duckduckgo_search_tool, tavily_search_tool
+from src.utils import agentRegistry
+from src.utils.llmCache import run_agent_cached
 
-def Search(ticker, period, gemini_api_key, tavily_api_key):
-    """
-    Search the internet for recent financial news, sentiment, and analyst commentary about a company.
-    Returns a structured summary of findings using multiple search tools.
-    """
-    # --- System prompt for the agent ---
-    system_prompt = """
+MODEL_NAME = 'gemini-2.0-flash'
+
+# --- System prompt for the agent ---
+SYSTEM_PROMPT = """
         You are a financial intelligence agent designed to search the internet for recent developments about a specified company. Your objective is to provide up-to-date, concise, and actionable insights for financial analysts or business users.
 
         Your responsibilities include:
@@ -52,20 +48,34 @@ def Search(ticker, period, gemini_api_key, tavily_api_key):
         Only return results relevant to the company. Do not speculate or fabricate information.
         """
 
-    # --- Initialize Gemini model and agent with search tools ---
-    model = GeminiModel('gemini-2.0-flash', provider=GoogleGLAProvider(api_key=gemini_api_key))
-    agent = Agent(
-        model=model,
+
+def _BuildAgent(gemini_api_key, tavily_api_key):
+    """Build the search agent; called once per API key pair through the agent registry."""
+    return Agent(
+        model=agentRegistry.get_model(MODEL_NAME, gemini_api_key),
         tools=[tavily_search_tool(tavily_api_key), duckduckgo_search_tool()],
-        system_prompt=system_prompt
+        system_prompt=SYSTEM_PROMPT
     )
 
+
+async def Search(ticker, period, gemini_api_key, tavily_api_key):
+    """
+    Search the internet for recent financial news, sentiment, and analyst commentary about a company.
+    Returns a structured summary of findings using multiple search tools.
+    """
+    # --- Shared Gemini agent with search tools ---
+    agent = agentRegistry.get_agent("internetSearch", _BuildAgent, gemini_api_key, tavily_api_key)
+
     # --- Build search prompt ---
     prompt = ticker + " " + period
 
     # --- Run the agent to perform search and summarization ---
     try:
-        result = agent.run_sync([prompt])
+        # Individual search requests are cached and rate limited by the search tools
+        result = await run_agent_cached(
+            "internetSearch", agent, [prompt],
+            model_name=MODEL_NAME, key_inputs=[SYSTEM_PROMPT]
+        )
         return result
     except Exception as e:
         # Return a structured error response
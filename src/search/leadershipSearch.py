@@ -1,13 +1,14 @@
 import json
 import os
-import re
-from typing import Dict
+from typing import Dict, List, Literal
 from dotenv import load_dotenv
-from pydantic_ai.models.gemini import GeminiModel
-from pydantic_ai.providers.google_gla import GoogleGLAProvider
-from pydantic_ai.common_tools.duckduckgo import duckduckgo_search_tool
-from pydantic_ai import Agent
+from pydantic import BaseModel, Field
+from dataclasses import dataclass
+from pydantic_ai import Agent, RunContext
 import asyncio  
+from src.search.searchTools import duckduckgo_search_tool
+from src.utils import agentRegistry
+from src.utils.llmCache import run_agent_cached
 
 """
 LeadershipSearch.py - Search leadership changes for a specific quarter range
@@ -41,6 +42,78 @@ example_output = """{
   ]
 }"""
 
+# Stable model with good rate limits
+MODEL_NAME = "gemini-2.5-flash"
+
+# --- Data Models for Output Structure ---
+class LeadershipUpdate(BaseModel):
+    title: str = Field(..., description="Event headline")
+    source: str = Field(..., description="Publication name")
+    date: str = Field(..., description="Specific date or quarter of the event")
+    category: Literal["executive_changes", "board_changes", "compensation", "restructuring"] = Field(..., description="Category of the leadership event")
+    details: str = Field(..., description="Full description of what happened")
+
+
+class LeadershipSearchOutput(BaseModel):
+    company: str = Field(..., description="Company ticker symbol")
+    date_range: str = Field(..., description="Date range covered by the search")
+    leadership_updates: List[LeadershipUpdate] = Field(..., description="Leadership events sorted chronologically")
+
+
+@dataclass
+class LeadershipSearchDeps:
+    """Per-request values for the leadership search agent."""
+    ticker: str
+    start_period: str
+    end_period: str
+
+
+SYSTEM_PROMPT_TEMPLATE = """Search for {ticker} leadership changes from {start_period} to {end_period}.
+
+TASK:
+1. Search comprehensively for ALL leadership events in this period
+2. Extract and structure findings chronologically
+
+SEARCH FOCUS:
+- C-Suite changes (CEO, CFO, CTO, COO, CMO, etc.)
+- Board member appointments/departures
+- Executive compensation updates
+- Leadership restructuring
+- Succession planning
+
+DATE RANGE: You MUST find events from {start_period} through {end_period}
+This covers approximately 15-21 months of leadership activity.
+
+For every event record a headline, the publication name, a specific date or quarter,
+a category (executive_changes, board_changes, compensation or restructuring) and
+a full description of what happened.
+
+IMPORTANT:
+- Include ALL events from {start_period} to {end_period}
+- Sort events chronologically
+- Only include verified events with sources
+- If no events found, return empty leadership_updates array"""
+
+
+def _SystemPrompt(ctx: RunContext[LeadershipSearchDeps]) -> str:
+    """Fill the ticker and quarter range of the current request into the system prompt."""
+    return SYSTEM_PROMPT_TEMPLATE.format(
+        ticker=ctx.deps.ticker, start_period=ctx.deps.start_period, end_period=ctx.deps.end_period
+    )
+
+
+def _BuildAgent(gemini_api_key):
+    """Build the leadership search agent; called once per API key through the agent registry."""
+    agent = Agent(
+        model=agentRegistry.get_model(MODEL_NAME, gemini_api_key),
+        tools=[duckduckgo_search_tool()],
+        deps_type=LeadershipSearchDeps,
+        output_type=LeadershipSearchOutput
+    )
+    agent.system_prompt(_SystemPrompt)
+    return agent
+
+
 async def LeadershipSearch(ticker: str, period: str, gemini_api_key: str) -> Dict:
     """
     Search for leadership changes from Q1 of previous year to specified period.
@@ -62,12 +135,6 @@ async def LeadershipSearch(ticker: str, period: str, gemini_api_key: str) -> Dic
     end_period = period
     date_range = f"{start_period} to {end_period}"
     
-    # Use stable model with good rate limits
-    model = GeminiModel(
-        "gemini-2.5-flash",
-        provider=GoogleGLAProvider(api_key=gemini_api_key)
-    )
-    
     # Single comprehensive search query
     search_query = f"""
     {ticker} leadership changes from {start_period} through {end_period}:
@@ -77,62 +144,26 @@ async def LeadershipSearch(ticker: str, period: str, gemini_api_key: str) -> Dic
     - Management restructuring succession planning
     """
     
-    # Single agent for search and structure
-    agent = Agent(
-        model=model,
-        tools=[duckduckgo_search_tool()],
-        system_prompt=f"""Search for {ticker} leadership changes from {start_period} to {end_period}.
-
-TASK:
-1. Search comprehensively for ALL leadership events in this period
-2. Extract and structure findings chronologically
-
-SEARCH FOCUS:
-- C-Suite changes (CEO, CFO, CTO, COO, CMO, etc.)
-- Board member appointments/departures
-- Executive compensation updates
-- Leadership restructuring
-- Succession planning
-
-DATE RANGE: You MUST find events from {start_period} through {end_period}
-This covers approximately 15-21 months of leadership activity.
-
-OUTPUT FORMAT - Return ONLY this JSON:
-{{
-    "company": "{ticker}",
-    "date_range": "{date_range}",
-    "leadership_updates": [
-        {{
-            "title": "Event headline",
-            "source": "Publication name",
-            "date": "Specific date or quarter",
-            "category": "executive_changes|board_changes|compensation|restructuring",
-            "details": "Full description of what happened"
-        }}
-    ]
-}}
-
-IMPORTANT:
-- Include ALL events from {start_period} to {end_period}
-- Sort events chronologically
-- Only include verified events with sources
-- If no events found, return empty leadership_updates array"""
-    )
+    # Single shared agent for search and structure
+    agent = agentRegistry.get_agent("leadershipSearch", _BuildAgent, gemini_api_key)
     
     try:
-        # Execute search directly without asyncio.to_thread
-        result = agent.run_sync(search_query)
+        # Await the agent natively so concurrent callers share the event loop
+        result = await run_agent_cached(
+            "leadershipSearch", agent, search_query,
+            model_name=MODEL_NAME, output_type=LeadershipSearchOutput, key_inputs=[SYSTEM_PROMPT_TEMPLATE],
+            deps=LeadershipSearchDeps(ticker=ticker, start_period=start_period, end_period=end_period)
+        )
         
-        # Parse JSON response
+        # Keep the structured findings so downstream agents can reuse them
         if result.output:
-            json_match = re.search(r'\{[\s\S]*\}', result.output)
-            if json_match:
-                data = json.loads(json_match.group())
-                # Ensure date_range is set correctly
-                data["date_range"] = date_range
-                return data
+            data = result.output.model_dump()
+            data["company"] = ticker
+            # Ensure date_range is set correctly
+            data["date_range"] = date_range
+            return data
         
-        # Fallback if no valid JSON
+        # Fallback if no structured output
         return {
             "company": ticker,
             "date_range": date_range,
@@ -169,7 +200,7 @@ def main():
     period = f"{sys.argv[2]} {sys.argv[3]}" if len(sys.argv) > 3 else sys.argv[2]
     
     # Execute search
-    result = LeadershipSearch(ticker, period, gemini_key)
+    result = asyncio.run(LeadershipSearch(ticker, period, gemini_key))
     
     # Output JSON
     print(json.dumps(result, indent=2))
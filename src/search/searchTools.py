@@ -0,0 +1,160 @@
+"""
+Shared web search tools for the search agents (internetSearch, leadershipSearch).
+
+The tools keep the names, parameters and result shapes of pydantic-ai's Tavily and DuckDuckGo
+tools, and add three things every search goes through:
+
+- a disk-backed result cache (util/database/search_cache.db) keyed by provider, normalised query
+  (case and whitespace folded) and options, with a TTL per provider
+- coalescing: concurrent identical queries (e.g. several reports on the same ticker in a batch)
+  share one HTTP call
+- per-provider rate limits (TAVILY_RPM, DUCKDUCKGO_RPM), applied to actual HTTP calls only
+
+SEARCH_PROVIDER=stub replaces every provider with offline canned results, so the pipeline runs
+without search API keys or network access to the search providers. Results are read from the
+JSON file in SEARCH_STUB_FILE ({"<query>": [results]}) when it has the query, and generated
+otherwise.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Literal, Optional, Tuple
+
+from pydantic_ai import Tool
+from pydantic_ai.common_tools.duckduckgo import DDGS, DuckDuckGoSearchTool
+from pydantic_ai.common_tools.tavily import AsyncTavilyClient, TavilySearchTool
+
+from src.utils.llmCache import LLMCache, cache_enabled, get_ttl, project_root, refreshing
+from src.utils.rateLimiter import RateLimiter, duckduckgo_limiter, tavily_limiter
+
+search_cache_db = os.path.join(project_root, "util", "database", "search_cache.db")
+search_cache = LLMCache(search_cache_db)
+
+TAVILY_DESCRIPTION = "Searches Tavily for the given query and returns the results."
+DUCKDUCKGO_DESCRIPTION = "Searches DuckDuckGo for the given query and returns the results."
+
+# Searches currently being fetched, per event loop, so identical queries share one request
+_in_flight: Dict[Tuple[int, str], asyncio.Future] = {}
+
+
+def stub_mode() -> bool:
+    """Whether searches are served by the offline stub provider (SEARCH_PROVIDER=stub)."""
+    return os.getenv("SEARCH_PROVIDER", "").lower() == "stub"
+
+
+def normalize_query(query: str) -> str:
+    """Fold case and whitespace so trivially different spellings of a query share a cache entry."""
+    return " ".join(query.lower().split())
+
+
+def search_cache_key(provider: str, query: str, options: Dict[str, Any]) -> str:
+    payload = {"provider": provider, "query": normalize_query(query), "options": options}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def stub_results(provider: str, query: str) -> List[Dict[str, Any]]:
+    """Canned results for a query in the provider's result shape."""
+    stub_file = os.getenv("SEARCH_STUB_FILE")
+    if stub_file and os.path.exists(stub_file):
+        with open(stub_file) as f:
+            fixtures = {normalize_query(key): value for key, value in json.load(f).items()}
+        if normalize_query(query) in fixtures:
+            return fixtures[normalize_query(query)]
+    title = f"Offline stub result for: {query}"
+    content = "Search is running against the offline stub provider; no live results are available."
+    slug = hashlib.sha256(normalize_query(query).encode("utf-8")).hexdigest()[:12]
+    if provider == "duckduckgo":
+        return [{"title": title, "href": f"https://example.com/{slug}", "body": content}]
+    return [{"title": title, "url": f"https://example.com/{slug}", "content": content, "score": 0.0}]
+
+
+async def _fetch_and_store(key: str, provider: str, fetch: Callable[[], Awaitable[list]], limiter: RateLimiter) -> list:
+    await limiter.acquire()
+    results = await fetch()
+    if cache_enabled():
+        search_cache.set(key, f"{provider}_search", "search", results, get_ttl(f"{provider}_search"))
+    return results
+
+
+async def cached_search(provider: str, query: str, fetch: Callable[[], Awaitable[list]], limiter: RateLimiter, **options) -> list:
+    """
+    Results of one search: from the cache, from an identical request already in flight, or from
+    fetch() (the actual HTTP call, made under the provider's rate limit and then cached).
+    """
+    if stub_mode():
+        return stub_results(provider, query)
+    key = search_cache_key(provider, query, options)
+    if cache_enabled() and not refreshing():
+        cached = search_cache.get(key)
+        if cached is not None:
+            return cached
+
+    flight_key = (id(asyncio.get_running_loop()), key)
+    future = _in_flight.get(flight_key)
+    if future is None:
+        future = asyncio.ensure_future(_fetch_and_store(key, provider, fetch, limiter))
+        _in_flight[flight_key] = future
+        future.add_done_callback(lambda _: _in_flight.pop(flight_key, None))
+    # A caller that is cancelled must not cancel the request other callers are waiting on
+    return await asyncio.shield(future)
+
+
+def tavily_search_tool(api_key: Optional[str]) -> Tool:
+    """Tavily search tool with the same interface as pydantic-ai's, going through the shared cache and limits."""
+    client = None
+
+    async def tavily_search(
+        query: str,
+        search_deep: Literal['basic', 'advanced'] = 'basic',
+        topic: Literal['general', 'news'] = 'general',
+        time_range: Optional[Literal['day', 'week', 'month', 'year', 'd', 'w', 'm', 'y']] = None,
+    ) -> list:
+        """Searches Tavily for the given query and returns the results.
+
+        Args:
+            query: The search query to execute with Tavily.
+            search_deep: The depth of the search.
+            topic: The category of the search.
+            time_range: The time range back from the current date to filter results.
+
+        Returns:
+            The search results.
+        """
+        async def fetch():
+            nonlocal client
+            # Clients are created on first use, so stub runs need no API key
+            if client is None:
+                client = TavilySearchTool(client=AsyncTavilyClient(api_key))
+            return await client(query, search_deep=search_deep, topic=topic, time_range=time_range)
+
+        return await cached_search(
+            "tavily", query, fetch, tavily_limiter, search_deep=search_deep, topic=topic, time_range=time_range
+        )
+
+    return Tool(tavily_search, name="tavily_search", description=TAVILY_DESCRIPTION)
+
+
+def duckduckgo_search_tool(max_results: Optional[int] = None) -> Tool:
+    """DuckDuckGo search tool with the same interface as pydantic-ai's, going through the shared cache and limits."""
+    client = None
+
+    async def duckduckgo_search(query: str) -> list:
+        """Searches DuckDuckGo for the given query and returns the results.
+
+        Args:
+            query: The query to search for.
+
+        Returns:
+            The search results.
+        """
+        async def fetch():
+            nonlocal client
+            if client is None:
+                client = DuckDuckGoSearchTool(client=DDGS(), max_results=max_results)
+            return await client(query)
+
+        return await cached_search("duckduckgo", query, fetch, duckduckgo_limiter, max_results=max_results)
+
+    return Tool(duckduckgo_search, name="duckduckgo_search", description=DUCKDUCKGO_DESCRIPTION)
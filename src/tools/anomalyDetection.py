@@ -1,13 +1,33 @@
+import argparse
+import math
+import time
+from collections import deque
+from typing import List, Literal, Optional
 import pandas as pd
 import numpy as np
 from src.data import dbextract
-from sklearn.linear_model import LinearRegression
+from src.database import schema
+from src.tools import trendEngine
 from pydantic_ai import Tool
 
+DetectorName = Literal["simpleAverages", "linearRegression", "rollingZScore", "ewma", "seasonal"]
+DEFAULT_DETECTORS = ["simpleAverages", "linearRegression"]
+
 # -------------------------------
 # Main Function
 # -------------------------------
-def FindAnomaly(ticker: str, period: str) -> dict:
+def FindAnomaly(ticker: str, period: str, detectors: Optional[List[DetectorName]] = None) -> dict:
+    detectors = list(detectors) if detectors else DEFAULT_DETECTORS
+    unknown = [name for name in detectors if name not in DETECTORS]
+    if unknown:
+        return {
+            "error": f"Unknown detector(s) {', '.join(unknown)}. Available detectors: {', '.join(DETECTORS)}."
+        }
+
+    # Averages and trends come from the stored aggregates; other detectors replay the history
+    if all(hasattr(DETECTORS[name], "from_stats") for name in detectors):
+        return FindAnomalyFromStats(ticker, period, detectors)
+
     data = dbextract.extract_ticker_data(ticker, period)
     
     # Handle case where no data is available
@@ -36,15 +56,43 @@ def FindAnomaly(ticker: str, period: str) -> dict:
     current_metrics = sorted_quarters[-1][1]
     past_quarters = dict(sorted_quarters[:-1])
 
+    # One section per selected detector
+    result = RunDetectors(detectors, current_quarter, current_metrics, past_quarters)
+
+    # {metric: {detector: label}}
+    return {metric: {name: result[name][metric] for name in detectors} for metric in current_metrics}
+
+def FindAnomalyFromStats(ticker, period, detectors):
+    """
+    FindAnomaly for detectors that can start from stored sufficient statistics: reads the latest
+    quarter and one aggregate row per metric instead of the ticker's history.
+    """
+    stored = dbextract.extract_anomaly_stats(ticker, period)
+    if stored is None:
+        return {
+            "error": f"No financial data available for ticker {ticker} and period {period}. Please ensure the period is in the format 'Q<1-4> YYYY' (e.g., 'Q3 2024')."
+        }
+    current_key, current_metrics, stats, has_history = stored
+    if not has_history:
+        return {
+            "error": f"Insufficient historical data for {ticker}. Need at least 2 quarters of data for anomaly detection."
+        }
+
+    current_quarter = (current_key - 1) / 4
     result = {}
-    # Simple Average Comparison
-    historical_averages = ComputeSimpleAverages(past_quarters)
-    result["simpleAverages"] = CompareSimpleAverages(current_metrics, historical_averages)
-    # Linear Regression Comparison
-    result["linearRegression"] = CompareLinearRegression(current_quarter, current_metrics, past_quarters)
+    for name in detectors:
+        detector_class = DETECTORS[name]
+        labels = {}
+        for metric, value in current_metrics.items():
+            if value is None or value != value:
+                labels[metric] = Detector.no_current
+                continue
+            detector = detector_class.from_stats(stats[metric]) if metric in stats else detector_class()
+            labels[metric] = detector.assess(current_quarter, value)
+        result[name] = labels
 
-    df = pd.DataFrame(result).T
-    return df.to_dict()
+    # {metric: {detector: label}}
+    return {metric: {name: result[name][metric] for name in detectors} for metric in current_metrics}
 
 
 # -------------------------------
@@ -55,39 +103,32 @@ def ComputeLRPredictedValue(currentQuarter, currentQuarterValue, metricDict):
     Predict the expected value for the current quarter using linear regression on historical data.
     Returns a qualitative assessment based on deviation from the predicted value.
     """
-    threshold = 0.1  # Threshold for significant change
-    quarters = np.array(list(metricDict.keys())).reshape(-1, 1)
-    values = np.array(list(metricDict.values()))
-    model = LinearRegression()
-    model.fit(quarters, values)
+    quarters = np.array(list(metricDict.keys()), dtype=float)
+    values = np.array([list(metricDict.values())], dtype=float)
     # Require at least some fit quality (R^2 > 0.7)
-    if model.score(quarters, values) < 0.7:
-        return "Model not valid"
-    predicted = model.predict(np.array([[currentQuarter]]))[0]
-    diff_ratio = (currentQuarterValue - predicted) / abs(predicted)
-    if diff_ratio > threshold:
-        return "Higher than expected"
-    elif diff_ratio < -threshold:
-        return "Lower than expected"
-    return "Changes within the tolerable range"
+    labels, _, _ = trendEngine.TrendLabels(quarters, values, currentQuarter, [currentQuarterValue])
+    return str(labels[0])
 
 def CompareLinearRegression(currentQuarter, currentQuarterDict, pastQuartersDict):
     """
     Compare current quarter metrics to historical trends using linear regression.
+    All metrics are fitted at once as rows of a (metric x quarter) matrix, NaN where a quarter lacks the metric.
     Returns a dictionary of qualitative assessments for each metric.
     """
-    metric_history = {key: {} for key in currentQuarterDict}
+    metrics = list(currentQuarterDict)
+    past = sorted((float(quarter), values) for quarter, values in pastQuartersDict.items())
+    quarters = np.array([quarter for quarter, _ in past])
+    history = np.full((len(metrics), len(past)), np.nan)
     # Build historical data for each metric
-    for quarter, metrics in pastQuartersDict.items():
-        for key, value in metrics.items():
-            if key in metric_history:
-                metric_history[key][float(quarter)] = value
+    for column, (_, past_metrics) in enumerate(past):
+        for row, key in enumerate(metrics):
+            if key in past_metrics:
+                history[row, column] = past_metrics[key]
+    current_values = np.array([currentQuarterDict[key] for key in metrics], dtype=float)
+    labels, _, fit = trendEngine.TrendLabels(quarters, history, currentQuarter, current_values)
     result = {}
-    for key, history in metric_history.items():
-        if not history:
-            result[key] = "No Historical Data"
-        else:
-            result[key] = ComputeLRPredictedValue(currentQuarter, currentQuarterDict[key], history)
+    for key, label, count in zip(metrics, labels, fit["n"]):
+        result[key] = "No Historical Data" if count == 0 else str(label)
     return result
 
 def ComputeSimpleAverages(pastQuartersDict):
@@ -125,11 +166,361 @@ def CompareSimpleAverages(currentQuarter, historicalSimpleAverages):
     return changes
 
 
+# -------------------------------
+# Detectors
+# -------------------------------
+# A detector follows one metric of one ticker. update() folds in the next quarter in O(1) from
+# incremental statistics (no re-scan of the history), and assess() labels a new value against the
+# state so far without changing it. Quarters are floats (year + 0.25 * (quarter - 1)).
+
+class Detector:
+    """Base class: expected() gives the baseline for a quarter, or None if there is too little history."""
+
+    name = ""
+    no_history = "No Historical Data"
+    # Label for a metric stored as NULL in the current quarter; callers skip assess() for it
+    no_current = "No Current Data"
+
+    def __init__(self, threshold=trendEngine.DEFAULT_THRESHOLD):
+        self.threshold = threshold
+
+    def update(self, quarter, value):
+        raise NotImplementedError
+
+    def expected(self, quarter):
+        raise NotImplementedError
+
+    def assess(self, quarter, value):
+        """Label value against the baseline by its relative deviation, as CompareSimpleAverages does."""
+        expected = self.expected(quarter)
+        if expected is None:
+            return self.no_history
+        return str(trendEngine.ClassifyDeviations(trendEngine.DeviationRatios(value, expected), self.threshold))
+
+
+class SimpleAverageDetector(Detector):
+    """Mean of all earlier quarters (running sum and count)."""
+
+    name = "simpleAverages"
+    no_history = "No historical data"
+
+    def __init__(self, threshold=trendEngine.DEFAULT_THRESHOLD):
+        super().__init__(threshold)
+        self.count = 0
+        self.total = 0.0
+
+    @classmethod
+    def from_stats(cls, stats, **kwargs):
+        """Start from stored totals (see src.database.anomalyStats)."""
+        detector = cls(**kwargs)
+        detector.count = stats["n"]
+        detector.total = stats["n"] * stats["shift"] + stats["sum_y"]
+        return detector
+
+    def update(self, quarter, value):
+        self.count += 1
+        self.total += value
+
+    def expected(self, quarter):
+        return self.total / self.count if self.count else None
+
+
+class LinearTrendDetector(Detector):
+    """
+    Least-squares line through all earlier quarters, from running means and co-moments (Welford's
+    update, numerically stable for large values). Reports "Model not valid" below min_r2, like trendEngine.
+    """
+
+    name = "linearRegression"
+
+    def __init__(self, threshold=trendEngine.DEFAULT_THRESHOLD, min_r2=trendEngine.MIN_R2):
+        super().__init__(threshold)
+        self.min_r2 = min_r2
+        self.count = 0
+        self.mean_x = self.mean_y = 0.0
+        self.cxx = self.cxy = self.cyy = 0.0
+
+    @classmethod
+    def from_stats(cls, stats, **kwargs):
+        """Start from stored totals over t = period key, i.e. quarter = (t - 1) / 4."""
+        detector = cls(**kwargs)
+        n = detector.count = stats["n"]
+        sum_t, sum_y = stats["sum_t"], stats["sum_y"]
+        detector.mean_x = (sum_t / n - 1) / 4
+        detector.mean_y = stats["shift"] + sum_y / n
+        detector.cxx = max(stats["sum_tt"] - sum_t * sum_t / n, 0.0) / 16
+        detector.cxy = (stats["sum_ty"] - sum_t * sum_y / n) / 4
+        detector.cyy = max(stats["sum_yy"] - sum_y * sum_y / n, 0.0)
+        return detector
+
+    def update(self, quarter, value):
+        self.count += 1
+        dx = quarter - self.mean_x
+        dy = value - self.mean_y
+        self.mean_x += dx / self.count
+        self.mean_y += dy / self.count
+        self.cxx += dx * (quarter - self.mean_x)
+        self.cxy += dx * (value - self.mean_y)
+        self.cyy += dy * (value - self.mean_y)
+
+    def slope(self):
+        return self.cxy / self.cxx if self.cxx > 0 else 0.0
+
+    def r2(self):
+        if self.count < 2:
+            return math.nan
+        ss_res = max(self.cyy - self.slope() * self.cxy, 0.0)
+        if self.cyy > 0:
+            return 1 - ss_res / self.cyy
+        return 1.0 if ss_res == 0 else 0.0
+
+    def expected(self, quarter):
+        if not self.count:
+            return None
+        return self.mean_y + self.slope() * (quarter - self.mean_x)
+
+    def assess(self, quarter, value):
+        # A NaN R^2 (single observation) is not "below" the threshold
+        if self.count and self.r2() < self.min_r2:
+            return trendEngine.MODEL_NOT_VALID
+        return super().assess(quarter, value)
+
+
+class RollingZScoreDetector(Detector):
+    """
+    z-score against the mean and standard deviation of the last `window` quarters (3-sigma rule by default).
+    The window statistics are kept with Welford's add/remove updates.
+    """
+
+    name = "rollingZScore"
+
+    def __init__(self, window=8, z_threshold=3.0, min_periods=3):
+        super().__init__()
+        self.z_threshold = z_threshold
+        self.min_periods = min_periods
+        self.window = deque(maxlen=window)
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, quarter, value):
+        if len(self.window) == self.window.maxlen:
+            old = self.window[0]
+            count = len(self.window) - 1
+            if count:
+                delta = old - self.mean
+                self.mean -= delta / count
+                self.m2 = max(self.m2 - delta * (old - self.mean), 0.0)
+            else:
+                self.mean = self.m2 = 0.0
+        self.window.append(value)
+        delta = value - self.mean
+        self.mean += delta / len(self.window)
+        self.m2 += delta * (value - self.mean)
+
+    def expected(self, quarter):
+        return self.mean if len(self.window) >= self.min_periods else None
+
+    def zscore(self, value):
+        std = math.sqrt(self.m2 / (len(self.window) - 1))
+        if std == 0:
+            return 0.0 if value == self.mean else math.copysign(math.inf, value - self.mean)
+        return (value - self.mean) / std
+
+    def assess(self, quarter, value):
+        if self.expected(quarter) is None:
+            return self.no_history
+        z = self.zscore(value)
+        if z > self.z_threshold:
+            return trendEngine.HIGHER
+        if z < -self.z_threshold:
+            return trendEngine.LOWER
+        return trendEngine.WITHIN
+
+
+class EWMADetector(Detector):
+    """Exponentially weighted moving average (simple exponential smoothing) of earlier quarters."""
+
+    name = "ewma"
+
+    def __init__(self, alpha=0.5, threshold=trendEngine.DEFAULT_THRESHOLD):
+        super().__init__(threshold)
+        self.alpha = alpha
+        self.level = None
+
+    def update(self, quarter, value):
+        self.level = value if self.level is None else self.alpha * value + (1 - self.alpha) * self.level
+
+    def expected(self, quarter):
+        return self.level
+
+
+class SeasonalDetector(Detector):
+    """Same quarter of the previous year as the baseline; only the last year of quarters is kept."""
+
+    name = "seasonal"
+
+    def __init__(self, threshold=trendEngine.DEFAULT_THRESHOLD):
+        super().__init__(threshold)
+        self.last_year = {}
+
+    def update(self, quarter, value):
+        self.last_year[quarter] = value
+        for old in [key for key in self.last_year if key <= quarter - 1]:
+            del self.last_year[old]
+
+    def expected(self, quarter):
+        return self.last_year.get(quarter - 1)
+
+
+DETECTORS = {
+    detector.name: detector
+    for detector in (SimpleAverageDetector, LinearTrendDetector, RollingZScoreDetector, EWMADetector, SeasonalDetector)
+}
+
+def RunDetectors(names, currentQuarter, currentQuarterDict, pastQuartersDict):
+    """
+    Feed each metric's history through the named detectors and assess the current quarter.
+    Returns {detector name: {metric: label}}.
+    """
+    past = sorted((float(quarter), values) for quarter, values in pastQuartersDict.items())
+    result = {}
+    for name in names:
+        labels = {}
+        for metric, value in currentQuarterDict.items():
+            if value is None or value != value:
+                labels[metric] = Detector.no_current
+                continue
+            detector = DETECTORS[name]()
+            for quarter, past_metrics in past:
+                past_value = past_metrics.get(metric)
+                if past_value is not None and past_value == past_value:
+                    detector.update(quarter, past_value)
+            labels[metric] = detector.assess(currentQuarter, value)
+        result[name] = labels
+    return result
+
+
+# -------------------------------
+# Universe Screening
+# -------------------------------
+SCREEN_COLUMNS = ["ticker", "quarter", "metric", "method", "actual", "expected", "deviation_ratio", "assessment"]
+
+def ScreenAnomaliesFrame(period, tickers=None, threshold=trendEngine.DEFAULT_THRESHOLD):
+    """
+    Run the simple-average and linear-regression checks of FindAnomaly for every ticker (or `tickers`) at once.
+    Each ticker's latest quarter before `period` is compared with its earlier quarters, exactly as
+    FindAnomaly does; tickers with fewer than 2 quarters are skipped.
+    Returns a long DataFrame (one row per ticker, metric and method) ranked by |deviation_ratio|.
+    """
+    panel = dbextract.extract_panel(tickers, period)
+    if panel.empty:
+        return pd.DataFrame(columns=SCREEN_COLUMNS)
+
+    # (ticker x quarter x metric) panel, quarters ascending
+    values, ticker_list, period_keys, metrics = dbextract.panel_to_array(panel)
+    n_tickers, n_quarters, n_metrics = values.shape
+    has_quarter = ~np.isnan(values).all(axis=2)
+    latest = n_quarters - 1 - np.argmax(has_quarter[:, ::-1], axis=1)
+    screened = has_quarter.sum(axis=1) >= 2
+
+    current = values[np.arange(n_tickers), latest, :]
+    before_latest = np.arange(n_quarters)[None, :] < latest[:, None]
+    history = np.where(before_latest[:, :, None], values, np.nan)
+
+    # Simple averages over all earlier quarters
+    counts = (~np.isnan(history)).sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        averages = np.nansum(history, axis=1) / counts
+    average_ratios = trendEngine.DeviationRatios(current, averages)
+    average_labels = trendEngine.ClassifyDeviations(average_ratios, threshold)
+
+    # Linear trend per (ticker, metric) series; x is year + quarter fraction as in FindAnomaly
+    quarter_x = (period_keys - 1) / 4.0
+    series = history.transpose(0, 2, 1).reshape(n_tickers * n_metrics, n_quarters)
+    trend_labels, trend_ratios, fit = trendEngine.TrendLabels(
+        quarter_x, series, np.repeat(quarter_x[latest], n_metrics), current.reshape(-1), threshold
+    )
+    predicted = trendEngine.PredictLinearTrends(fit, np.repeat(quarter_x[latest], n_metrics))
+
+    base = pd.DataFrame({
+        "ticker": np.repeat(ticker_list, n_metrics),
+        "quarter": np.repeat([schema.period_label(key) for key in period_keys[latest]], n_metrics),
+        "metric": np.tile(metrics, n_tickers),
+        "actual": current.reshape(-1),
+    })
+    usable = np.repeat(screened, n_metrics) & ~np.isnan(base["actual"].to_numpy())
+    averages_frame = base.assign(method="simpleAverage", expected=averages.reshape(-1),
+                                 deviation_ratio=average_ratios.reshape(-1), assessment=average_labels.reshape(-1))
+    trends_frame = base.assign(method="linearRegression", expected=predicted,
+                               deviation_ratio=trend_ratios, assessment=trend_labels)
+    result = pd.concat([
+        averages_frame[usable & (counts.reshape(-1) > 0)],
+        trends_frame[usable & (fit["n"] > 0)],
+    ], ignore_index=True)[SCREEN_COLUMNS]
+
+    # Rank by size of the deviation; unusable trends and undefined ratios go last
+    rank = result["deviation_ratio"].abs().where(result["assessment"] != trendEngine.MODEL_NOT_VALID)
+    rank = rank.replace(np.inf, np.nan)
+    order = np.argsort(-rank.fillna(-1).to_numpy(), kind="stable")
+    return result.iloc[order].reset_index(drop=True)
+
+def ScreenAnomalies(period: str, top: int = 20) -> dict:
+    """
+    Screen every ticker in the database for anomalies in its latest quarter before `period`.
+    Returns the `top` largest deviations (Higher/Lower than expected) across all tickers and metrics.
+    """
+    if schema.period_key(period) is None:
+        return {"error": f"Invalid period {period}. Please use the format 'Q<1-4> YYYY' (e.g., 'Q3 2024')."}
+    table = ScreenAnomaliesFrame(period)
+    flagged = table[table["assessment"].isin([trendEngine.HIGHER, trendEngine.LOWER])].head(top)
+    return {
+        "period": period,
+        "tickers_screened": int(table["ticker"].nunique()),
+        "anomalies": flagged.round({"deviation_ratio": 4}).to_dict(orient="records"),
+    }
+
+
 # -------------------------------
 # Tool Declaration
 # -------------------------------
 AnomalyDetection = Tool(
         FindAnomaly,
         name="anomalyDetection",
-        description="Detects financial anomalies using simple average and regression trend analysis. REQUIRES both ticker (e.g., 'AAPL') and period (e.g., 'Q3 2024') parameters.",
-    )
\ No newline at end of file
+        description="Detects financial anomalies using simple average and regression trend analysis. REQUIRES both ticker (e.g., 'AAPL') and period (e.g., 'Q3 2024') parameters. Optional detectors selects the checks to run: simpleAverages and linearRegression (default), rollingZScore (3-sigma against the last 8 quarters), ewma (exponential smoothing) and seasonal (same quarter last year).",
+    )
+
+AnomalyScreen = Tool(
+        ScreenAnomalies,
+        name="anomalyScreen",
+        description="Screens every ticker in the database for the largest financial anomalies before a period (e.g., 'Q3 2024'), ranked by deviation from the historical average and trend. Use it to put one company's anomalies in the context of its peers.",
+    )
+
+
+# -------------------------------
+# Command-line Screening
+# -------------------------------
+def main(argv=None):
+    """Main function for command-line usage."""
+    parser = argparse.ArgumentParser(description="Screen all tickers in finance.db for anomalies.")
+    parser.add_argument("period", help="Cutoff period, e.g. 'Q1 2025' (the latest quarter before it is screened)")
+    parser.add_argument("--top", type=int, default=20, help="Number of rows to show")
+    parser.add_argument("--tickers", nargs="+", default=None, help="Only screen these tickers")
+    parser.add_argument("--all", action="store_true", help="Include rows within the tolerable range")
+    parser.add_argument("--csv", default=None, help="Write the full ranked table to this CSV file")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    table = ScreenAnomaliesFrame(args.period, tickers=args.tickers)
+    elapsed = time.perf_counter() - start
+    screened = table["ticker"].nunique()
+    if args.csv:
+        table.to_csv(args.csv, index=False)
+    if not args.all:
+        table = table[table["assessment"].isin([trendEngine.HIGHER, trendEngine.LOWER])]
+    print(f"Screened {screened} tickers for {args.period} in {elapsed:.3f}s")
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(table.head(args.top).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
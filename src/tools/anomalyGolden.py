@@ -0,0 +1,175 @@
+"""
+Golden corpus for the anomaly engine, so performance work on the detectors cannot silently change results.
+
+The corpus (util/database/anomaly_golden.json) is self-contained: it stores the financials rows it
+was built from (a snapshot of finance.db) together with the expected output of
+
+- FindAnomaly for every ticker and every cutoff period, with the default detectors (the stored
+  statistics path) and with all detectors (the history replay path), plus a few invalid inputs
+- ScreenAnomaliesFrame for every cutoff period (labels and deviation ratios)
+
+Verification loads the snapshot into a temporary database, re-runs everything and reports every
+difference, so it does not depend on the current contents of finance.db.
+
+Usage:
+    python -m src.tools.anomalyGolden                # verify against the corpus
+    python -m src.tools.anomalyGolden --update       # rebuild the corpus from finance.db
+"""
+
+import argparse
+import json
+import math
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+from src.data import dbextract
+from src.database import connection, schema
+from src.tools import anomalyDetection
+
+GOLDEN_PATH = os.path.join(connection.project_root, "util", "database", "anomaly_golden.json")
+GOLDEN_VERSION = 1
+
+DETECTOR_SETS = [anomalyDetection.DEFAULT_DETECTORS, list(anomalyDetection.DETECTORS)]
+SCREEN_FIELDS = ["ticker", "quarter", "metric", "method", "assessment", "deviation_ratio"]
+RATIO_TOLERANCE = 1e-9
+
+
+def snapshot_financials(db_path: str) -> List[list]:
+    """All financials rows of a database as [ticker, quarter, metric, value], in key order."""
+    conn = sqlite3.connect(db_path)
+    schema.ensure_financials_schema(conn)
+    rows = conn.execute('''
+        SELECT ticker, quarter, metric, value FROM financial_metrics ORDER BY ticker, period_key, metric
+    ''').fetchall()
+    conn.close()
+    return [list(row) for row in rows]
+
+
+@contextmanager
+def corpus_database(rows: List[list]) -> Iterator[str]:
+    """Point dbextract at a temporary database holding rows for the duration of the block."""
+    directory = tempfile.mkdtemp(prefix="anomaly_golden_")
+    path = os.path.join(directory, "finance.db")
+    saved_db = dbextract.finance_db
+    try:
+        with connection.transaction(path) as conn:
+            schema.upsert_financials(conn, [tuple(row) for row in rows])
+        dbextract.finance_db = path
+        dbextract.invalidate_history()
+        yield path
+    finally:
+        dbextract.finance_db = saved_db
+        dbextract.invalidate_history()
+        connection.close_connection(path)
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def cutoff_periods(rows: List[list]) -> List[str]:
+    """Every cutoff from just after the first stored quarter to just after the last one."""
+    keys = [schema.period_key(row[1]) for row in rows]
+    return [schema.period_label(key) for key in range(min(keys) + 1, max(keys) + 2)]
+
+
+def compute_results(rows: List[list]) -> Dict[str, list]:
+    """Run FindAnomaly and the universe screen over the corpus rows."""
+    tickers = sorted({row[0] for row in rows})
+    periods = cutoff_periods(rows)
+    cases = [(ticker, period) for ticker in tickers for period in periods]
+    # Inputs that must keep producing the same errors
+    cases += [(tickers[0], "Q5 2024"), (tickers[0], ""), ("NO_SUCH_TICKER", periods[-1])]
+
+    results = {"findAnomaly": [], "screens": []}
+    with corpus_database(rows):
+        for ticker, period in cases:
+            for detectors in DETECTOR_SETS:
+                results["findAnomaly"].append({
+                    "ticker": ticker, "period": period, "detectors": detectors,
+                    "result": anomalyDetection.FindAnomaly(ticker, period, detectors),
+                })
+        for period in periods:
+            table = anomalyDetection.ScreenAnomaliesFrame(period)
+            results["screens"].append({
+                "period": period,
+                "rows": table[SCREEN_FIELDS].astype(object).values.tolist(),
+            })
+    return results
+
+
+def build_golden(db_path: str = connection.FINANCE_DB, path: str = GOLDEN_PATH) -> Dict:
+    """Snapshot db_path and write the corpus with the current engine's results."""
+    rows = snapshot_financials(db_path)
+    golden = {"version": GOLDEN_VERSION, "financials": rows, **compute_results(rows)}
+    with open(path, "w") as f:
+        json.dump(golden, f, indent=1)
+        f.write("\n")
+    return golden
+
+
+def _same_ratio(expected, actual) -> bool:
+    if expected is None or actual is None:
+        return expected is actual
+    if math.isnan(expected) or math.isnan(actual):
+        return math.isnan(expected) and math.isnan(actual)
+    if math.isinf(expected) or math.isinf(actual):
+        return expected == actual
+    return math.isclose(expected, actual, rel_tol=RATIO_TOLERANCE, abs_tol=RATIO_TOLERANCE)
+
+
+def verify_golden(path: str = GOLDEN_PATH) -> List[str]:
+    """Re-run the corpus and return a description of every difference (empty if all results match)."""
+    with open(path) as f:
+        golden = json.load(f)
+    if golden.get("version") != GOLDEN_VERSION:
+        return [f"corpus version {golden.get('version')} != {GOLDEN_VERSION}; rebuild it with --update"]
+    actual = compute_results(golden["financials"])
+
+    problems = []
+    expected_cases = {(c["ticker"], c["period"], tuple(c["detectors"])): c["result"] for c in golden["findAnomaly"]}
+    for case in actual["findAnomaly"]:
+        key = (case["ticker"], case["period"], tuple(case["detectors"]))
+        expected = expected_cases.get(key)
+        if expected != case["result"]:
+            problems.append(f"FindAnomaly{key}: expected {expected}, got {case['result']}")
+
+    expected_screens = {screen["period"]: screen["rows"] for screen in golden["screens"]}
+    for screen in actual["screens"]:
+        expected = expected_screens.get(screen["period"], [])
+        if len(expected) != len(screen["rows"]):
+            problems.append(f"screen {screen['period']}: expected {len(expected)} rows, got {len(screen['rows'])}")
+            continue
+        for want, got in zip(expected, screen["rows"]):
+            if want[:-1] != got[:-1] or not _same_ratio(want[-1], got[-1]):
+                problems.append(f"screen {screen['period']}: expected {want}, got {got}")
+    return problems
+
+
+def main(argv=None):
+    """Main function for command-line usage."""
+    parser = argparse.ArgumentParser(description="Verify (or rebuild) the anomaly engine's golden corpus.")
+    parser.add_argument("--update", action="store_true", help="Rebuild the corpus from finance.db")
+    parser.add_argument("--db", default=connection.FINANCE_DB, help="Database to snapshot with --update")
+    parser.add_argument("--golden", default=GOLDEN_PATH, help="Corpus file")
+    args = parser.parse_args(argv)
+
+    if args.update:
+        golden = build_golden(args.db, args.golden)
+        print(f"Wrote {len(golden['findAnomaly'])} FindAnomaly cases and {len(golden['screens'])} screens "
+              f"to {args.golden}")
+        return
+
+    problems = verify_golden(args.golden)
+    for problem in problems:
+        print(problem)
+    if problems:
+        print(f"{len(problems)} result(s) differ from {args.golden}")
+        sys.exit(1)
+    print(f"All results match {args.golden}")
+
+
+if __name__ == "__main__":
+    main()
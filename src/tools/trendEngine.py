@@ -0,0 +1,98 @@
+import numpy as np
+
+# -------------------------------
+# Closed-form linear trends
+# -------------------------------
+# Ordinary least squares y = intercept + slope * x, fitted independently for every row (series) of a
+# (series x time) matrix in one vectorized pass. Missing observations are NaN and are masked out.
+# Results match sklearn's LinearRegression fit/score/predict for each series, including its edge cases:
+#   - a single observation gives slope 0, intercept y and an undefined (NaN) R^2
+#   - a constant series gives R^2 1.0 when the fit is exact and 0.0 otherwise
+
+DEFAULT_THRESHOLD = 0.1  # Relative deviation considered significant
+MIN_R2 = 0.7  # Minimum fit quality for a trend to be used
+
+HIGHER = "Higher than expected"
+LOWER = "Lower than expected"
+WITHIN = "Changes within the tolerable range"
+MODEL_NOT_VALID = "Model not valid"
+
+
+def FitLinearTrends(x, y):
+    """
+    Fit a least-squares line to every series at once.
+
+    Args:
+        x: Observation times, shape (time,) shared by all series or (series, time).
+        y: Observations, shape (series, time); NaN marks a missing value.
+
+    Returns:
+        dict of arrays with shape (series,): slope, intercept, r2 (NaN with fewer than 2 points)
+        and n (number of observations used).
+    """
+    y = np.atleast_2d(np.asarray(y, dtype=float))
+    x = np.broadcast_to(np.asarray(x, dtype=float), y.shape)
+    mask = ~np.isnan(y) & ~np.isnan(x)
+    n = mask.sum(axis=1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x_masked = np.where(mask, x, 0.0)
+        y_masked = np.where(mask, y, 0.0)
+        x_mean = x_masked.sum(axis=1) / n
+        y_mean = y_masked.sum(axis=1) / n
+        x_centered = np.where(mask, x - x_mean[:, None], 0.0)
+        y_centered = np.where(mask, y - y_mean[:, None], 0.0)
+
+        sxx = (x_centered * x_centered).sum(axis=1)
+        sxy = (x_centered * y_centered).sum(axis=1)
+        slope = np.where(sxx > 0, sxy / sxx, 0.0)
+        intercept = y_mean - slope * x_mean
+
+        residuals = np.where(mask, y - (x * slope[:, None] + intercept[:, None]), 0.0)
+        ss_res = (residuals * residuals).sum(axis=1)
+        ss_tot = (y_centered * y_centered).sum(axis=1)
+        r2 = np.where(ss_tot > 0, 1 - ss_res / ss_tot, np.where(ss_res == 0, 1.0, 0.0))
+    r2 = np.where(n >= 2, r2, np.nan)
+    return {"slope": slope, "intercept": intercept, "r2": r2, "n": n}
+
+
+def PredictLinearTrends(fit, x):
+    """Predicted value of every series at time x (scalar, or one value per series)."""
+    return fit["intercept"] + fit["slope"] * np.asarray(x, dtype=float)
+
+
+def DeviationRatios(actual, expected):
+    """Relative deviation (actual - expected) / |expected|; inf or NaN where expected is 0."""
+    actual = np.asarray(actual, dtype=float)
+    expected = np.asarray(expected, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (actual - expected) / np.abs(expected)
+
+
+def ClassifyDeviations(ratios, threshold=DEFAULT_THRESHOLD):
+    """Map deviation ratios to the qualitative labels used by the anomaly tool."""
+    ratios = np.asarray(ratios, dtype=float)
+    return np.where(ratios > threshold, HIGHER, np.where(ratios < -threshold, LOWER, WITHIN))
+
+
+def TrendLabels(x, y, current_x, current_values, threshold=DEFAULT_THRESHOLD, min_r2=MIN_R2):
+    """
+    Compare current values to the linear trend of their histories, for every series at once.
+
+    Args:
+        x: History times, shape (time,) or (series, time).
+        y: History values, shape (series, time) with NaN for missing.
+        current_x: Time of the current observation (scalar or per series).
+        current_values: Current value of every series, shape (series,).
+
+    Returns:
+        (labels, ratios, fit): labels is an array of "Higher/Lower than expected",
+        "Changes within the tolerable range" or "Model not valid" (R^2 below min_r2);
+        ratios are the deviations from the predicted values.
+    """
+    fit = FitLinearTrends(x, y)
+    predicted = PredictLinearTrends(fit, current_x)
+    ratios = DeviationRatios(current_values, predicted)
+    # A NaN R^2 (single observation) is not "below" the threshold, as with sklearn's score
+    labels = np.where(fit["r2"] < min_r2, MODEL_NOT_VALID, ClassifyDeviations(ratios, threshold))
+    return labels, ratios, fit
@@ -0,0 +1,135 @@
+"""
+Process-wide registry for Gemini models and pydantic-ai agents.
+
+Models and agents are built once per process (per API key) instead of on every call. Each API key
+gets its own HTTP client, since the Gemini provider stores the key in the client's headers, and
+all clients send their requests through one keep-alive connection pool per event loop, so
+connections and TLS sessions are reused without crossing loops (asyncio.run, run_sync and each
+Streamlit session run their own). Every HTTP request to Gemini waits on the shared Gemini rate
+limiter, so agent runs that call tools are charged once per model request. Per-request values
+such as ticker and period are passed to agents as run-time dependencies.
+"""
+
+import asyncio
+import os
+import threading
+import weakref
+from typing import Callable, Dict, Tuple
+
+import httpx
+from pydantic_ai import Agent
+from pydantic_ai.models.gemini import GeminiModel
+from pydantic_ai.providers.google_gla import GoogleGLAProvider
+
+from src.utils.rateLimiter import gemini_limiter
+
+# Connection pool sizing per event loop (enough for a batch run's concurrent agents)
+MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 32))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", 16))
+KEEPALIVE_EXPIRY = 60.0
+
+_lock = threading.Lock()
+_http_clients: Dict[str, httpx.AsyncClient] = {}
+_models: Dict[Tuple[str, str], GeminiModel] = {}
+_agents: Dict[Tuple, Agent] = {}
+
+
+class LoopPooledTransport(httpx.AsyncBaseTransport):
+    """
+    Transport that keeps one keep-alive connection pool per running event loop.
+    Pooled connections belong to the loop that opened them, so a client reused from another
+    (or a later) loop must not pick them up; pools of closed loops are dropped.
+    """
+
+    def __init__(self):
+        self._pools = weakref.WeakKeyDictionary()
+        self._pools_lock = threading.Lock()
+
+    def _pool(self) -> httpx.AsyncHTTPTransport:
+        loop = asyncio.get_running_loop()
+        with self._pools_lock:
+            for stale in [other for other in self._pools if other.is_closed()]:
+                del self._pools[stale]
+            pool = self._pools.get(loop)
+            if pool is None:
+                pool = httpx.AsyncHTTPTransport(
+                    limits=httpx.Limits(
+                        max_connections=MAX_CONNECTIONS,
+                        max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                        keepalive_expiry=KEEPALIVE_EXPIRY,
+                    ),
+                )
+                self._pools[loop] = pool
+            return pool
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._pool().handle_async_request(request)
+
+    async def aclose(self) -> None:
+        """Close the pool of the current loop; pools of other loops go away with their loops."""
+        loop = asyncio.get_running_loop()
+        with self._pools_lock:
+            pool = self._pools.pop(loop, None)
+        if pool is not None:
+            await pool.aclose()
+
+
+_transport = LoopPooledTransport()
+
+
+async def _wait_for_gemini_slot(request: httpx.Request) -> None:
+    """Request hook: every model request counts against the Gemini rate limit."""
+    await gemini_limiter.acquire()
+
+
+def get_http_client(api_key: str) -> httpx.AsyncClient:
+    """
+    Return the HTTP client for an API key, creating it again if it has been closed.
+    Clients of all keys share the per-loop connection pools of one transport.
+    """
+    with _lock:
+        client = _http_clients.get(api_key)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                timeout=httpx.Timeout(timeout=600, connect=5),
+                transport=_transport,
+                event_hooks={"request": [_wait_for_gemini_slot]},
+            )
+            _http_clients[api_key] = client
+        return client
+
+
+def get_model(model_name: str, gemini_api_key: str) -> GeminiModel:
+    """Return the Gemini model for a model name and API key, built once and backed by the key's client."""
+    key = (model_name, gemini_api_key)
+    with _lock:
+        model = _models.get(key)
+    if model is None:
+        provider = GoogleGLAProvider(api_key=gemini_api_key, http_client=get_http_client(gemini_api_key))
+        model = GeminiModel(model_name, provider=provider)
+        with _lock:
+            model = _models.setdefault(key, model)
+    return model
+
+
+def get_agent(name: str, builder: Callable[..., Agent], *args) -> Agent:
+    """
+    Return the agent registered under (name, *args), building it with builder(*args) on first use.
+    args are the values the agent is parameterised by, typically the API key(s).
+    """
+    key = (name, *args)
+    with _lock:
+        agent = _agents.get(key)
+    if agent is None:
+        agent = builder(*args)
+        with _lock:
+            agent = _agents.setdefault(key, agent)
+    return agent
+
+
+def clear() -> None:
+    """Forget every cached model and agent (e.g. after rotating API keys)."""
+    with _lock:
+        _http_clients.clear()
+        _models.clear()
+        _agents.clear()
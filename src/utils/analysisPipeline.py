@@ -0,0 +1,332 @@
+"""
+Analysis pipeline shared by the Streamlit app and the batch runner.
+Parses a report, runs the search and analysis agents, writes the database rows
+and builds the combined JSON, without any UI code.
+"""
+
+import os
+import re
+import asyncio
+from typing import Any, Callable, Dict, Optional
+
+from src.data import fileParser, parseStore
+from src.database import schema
+from src.search import internetSearch, leadershipSearch
+from src.analysis import sentimentAnalysis, financialAnalysis, leadershipAnalysis
+from src.data.updateDb import update_analysis_results
+from src.utils.combineAnalysis import combine_analysis_results
+from src.utils.timing import StageTimer
+
+
+def SameTickerPeriod(ticker_a: str, period_a: str, ticker_b: str, period_b: str) -> bool:
+    """Whether two (ticker, period) pairs name the same report, ignoring case and period formatting."""
+    if not ticker_a or not ticker_b or ticker_a.strip().upper() != ticker_b.strip().upper():
+        return False
+    key_a, key_b = schema.period_key(period_a), schema.period_key(period_b)
+    if key_a is not None and key_b is not None:
+        return key_a == key_b
+    return bool(period_a) and str(period_a).strip().upper() == str(period_b or "").strip().upper()
+
+
+class SpeculativeSearches:
+    """
+    Internet and leadership searches started from the ticker and period in the filename while the
+    report is still being parsed. Once the parse gives the real ticker and period, they are used if
+    they match and cancelled otherwise.
+    """
+
+    def __init__(self, ticker: str, period: str, gemini_api_key: str, tavily_api_key: str, timer: StageTimer):
+        self.ticker = ticker
+        self.period = period
+        self.active = True
+        self.search = asyncio.create_task(timer.track(
+            "Internet search", internetSearch.Search(ticker, period, gemini_api_key, tavily_api_key)
+        ))
+        self.leadership = asyncio.create_task(timer.track(
+            "Leadership search", leadershipSearch.LeadershipSearch(ticker, period, gemini_api_key)
+        ))
+
+    def matches(self, ticker: str, period: str) -> bool:
+        return self.active and SameTickerPeriod(self.ticker, self.period, ticker, period)
+
+    def cancel(self) -> None:
+        self.active = False
+        for task in (self.search, self.leadership):
+            task.cancel()
+
+
+def StartSpeculativeSearches(filename: str, gemini_api_key: str, tavily_api_key: str, timer: StageTimer) -> Optional[SpeculativeSearches]:
+    """Start the searches from a filename following the naming convention, or return None if it does not."""
+    expected = ParseReportFilename(filename or "")
+    if not expected["ticker"] or not expected["period"]:
+        return None
+    return SpeculativeSearches(expected["ticker"], expected["period"], gemini_api_key, tavily_api_key, timer)
+
+
+async def ParsePDFAndSearch(pdfBytes: bytes, gemini_api_key: str, tavily_api_key: str, analyst_name: str = None,
+                            speculative: Optional[SpeculativeSearches] = None) -> Dict[str, Any]:
+    """
+    Parse a PDF file, extract financial data, and perform an internet search for the ticker and period.
+    When speculative searches were started from the filename, their result is used if the parsed
+    ticker and period match, and they are cancelled (and the search run for the parsed values) if not.
+    Returns a dictionary with parsed and searched data.
+    """
+    # Parse the PDF and extract financial metrics and analyst info; a document parsed before
+    # (under the same schema) is served from the parse store without any network call
+    async def parse():
+        return (await fileParser.ParseFile(pdfBytes, gemini_api_key)).output
+
+    parsed = await parseStore.parse_once(pdfBytes, fileParser.SCHEMA_VERSION, fileParser.Output, parse)
+    fileParserOutput = dict(parsed)
+
+    # Ensure nested dicts for JSON compatibility
+    fileParserOutput["financialMetrics"] = dict(fileParserOutput.get("financialMetrics", {}))
+    fileParserOutput["analyst"] = dict(fileParserOutput.get("analyst", {}))
+
+    # Add analyst name after ticker key in financialMetrics if provided
+    if analyst_name:
+        # Create a new ordered dictionary to maintain key order
+        ordered_financial_metrics = {}
+        
+        # Add existing keys in desired order
+        if "ticker" in fileParserOutput["financialMetrics"]:
+            ordered_financial_metrics["ticker"] = fileParserOutput["financialMetrics"]["ticker"]
+        
+        # Add analyst_name after ticker
+        ordered_financial_metrics["analyst_name"] = analyst_name
+        
+        # Add all other existing keys
+        for key, value in fileParserOutput["financialMetrics"].items():
+            if key not in ordered_financial_metrics:
+                ordered_financial_metrics[key] = value
+        
+        fileParserOutput["financialMetrics"] = ordered_financial_metrics
+
+    ticker = fileParserOutput.get("ticker")
+    period = fileParserOutput.get("period")
+
+    # Reconcile the searches started from the filename with what the report says
+    if speculative is not None and not speculative.matches(ticker, period):
+        print(f"Report is {ticker} {period}, not {speculative.ticker} {speculative.period} as named; "
+              f"cancelling the searches started from the filename.")
+        speculative.cancel()
+
+    # Perform internet search if ticker and period are available
+    if ticker and period:
+        if speculative is not None and speculative.active:
+            searchResult = (await speculative.search).output
+        else:
+            searchResult = (await internetSearch.Search(ticker, period, gemini_api_key, tavily_api_key)).output
+        fileParserOutput["searchResult"] = searchResult
+    else:
+        fileParserOutput["searchResult"] = {}
+
+    # Database will be updated after analysis is complete
+
+    return fileParserOutput
+
+async def RunLeadershipPipeline(ticker: str, period: str, gemini_api_key: str, timer: StageTimer,
+                                speculative: Optional[SpeculativeSearches] = None,
+                                on_search: Optional[Callable[[Any], None]] = None):
+    """
+    Search for leadership changes once and feed the structured findings straight into
+    the leadership analysis agent. Returns (leadership_search, leadership_analysis).
+    A matching speculative leadership search is awaited instead of searching again.
+    on_search is called with the findings as soon as the search is done.
+    """
+    if speculative is not None and speculative.matches(ticker, period):
+        leadership_search = await speculative.leadership
+    else:
+        leadership_search = await timer.track(
+            "Leadership search",
+            leadershipSearch.LeadershipSearch(ticker, period, gemini_api_key)
+        )
+    if on_search is not None:
+        on_search(leadership_search)
+    leadership_analysis = await timer.track(
+        "Leadership analysis",
+        leadershipAnalysis.AnalyzeLeadership(ticker, period, gemini_api_key, leadership_search)
+    )
+    return leadership_search, leadership_analysis
+
+def ParseReportFilename(filename: str) -> Dict[str, Optional[str]]:
+    """
+    Parse a report filename following <analyst name> - <ticker> <quarter> <year>,
+    e.g. 'A - AAPL Q2 2025.pdf'. Fields that cannot be read are returned as None.
+    """
+    stem = os.path.basename(filename)
+    if stem.lower().endswith(".pdf"):
+        stem = stem[:-4]
+    parsed = {"analyst_name": None, "ticker": None, "period": None}
+    if " - " not in stem:
+        return parsed
+    analyst_part, rest = stem.split(" - ", 1)
+    parsed["analyst_name"] = analyst_part.strip() or None
+    match = re.match(r"^\s*([A-Za-z.\-]+)\s+(Q[1-4]|FY)\s+(\d{4})\b", rest, flags=re.IGNORECASE)
+    if match:
+        parsed["ticker"] = match.group(1).upper()
+        if match.group(2).upper() != "FY":
+            parsed["period"] = f"{match.group(2).upper()} {match.group(3)}"
+    return parsed
+
+def ExtractAnalystName(filename: str) -> str:
+    """
+    Extract the analyst name from a filename following <analyst name> - <ticker> <quarter> <year>.
+    Falls back to 'Analyst A' when the filename does not follow the convention.
+    """
+    analyst_name = "Analyst A"  # Default fallback
+    # Split by " - " to get analyst name and rest
+    if " - " in filename:
+        analyst_name = filename.split(" - ")[0].strip()
+        # Remove file extension if present
+        if "." in analyst_name:
+            analyst_name = analyst_name.rsplit(".", 1)[0]
+    return analyst_name
+
+def UpdateDatabase(ticker: str, period: str, analyst_name: str, financial: Any, sentiment: Any, leadership_analysis: Any) -> None:
+    """
+    Write the financial, sentiment and leadership analysis rows for one upload in a single transaction.
+    Results that are exceptions are skipped.
+    """
+    financial_data = sentiment_data = leadership_data = None
+
+    # Update financial analysis
+    if not isinstance(financial, Exception):
+        # Extract risk assessment from financial analysis
+        risk_assessment = "Based on financial analysis"
+        if hasattr(financial.output, 'risk_assessment'):
+            if hasattr(financial.output.risk_assessment, 'risk_level'):
+                risk_assessment = f"Risk Level: {financial.output.risk_assessment.risk_level}"
+            elif hasattr(financial.output.risk_assessment, 'key_risks'):
+                risk_assessment = f"Key Risks: {', '.join(financial.output.risk_assessment.key_risks[:3])}"
+
+        financial_data = {
+            'analyst_name': analyst_name,
+            'price_target': None,  # Extract from financial.output if available
+            'analyst_summary': getattr(financial.output, 'performance_summary', 'Analysis completed'),
+            'performance_summary': getattr(financial.output, 'performance_summary', 'Performance analyzed'),
+            'investment_outlook': getattr(financial.output, 'investment_outlook', 'Hold'),
+            'expected_values_future_quarters': 'To be calculated based on analysis',
+            'risk_assessment': risk_assessment
+        }
+
+    # Update sentiment analysis
+    if not isinstance(sentiment, Exception):
+        sentiment_data = {
+            'analyst_name': analyst_name,
+            'analyst_sentiment': getattr(sentiment.output.analyst_sentiment, 'sentiment', 'Neutral') if hasattr(sentiment.output, 'analyst_sentiment') else 'Neutral',
+            'market_sentiment': getattr(sentiment.output.market_sentiment, 'sentiment', 'Neutral') if hasattr(sentiment.output, 'market_sentiment') else 'Neutral'
+        }
+
+    # Update leadership analysis
+    if not isinstance(leadership_analysis, Exception):
+        leadership_data = {
+            'analyst_name': analyst_name,
+            'stability_assessment': str(getattr(leadership_analysis.output.stability_assessment, 'stability_score', 'Stable')) if hasattr(leadership_analysis.output, 'stability_assessment') else 'Stable',
+            'investor_implications': getattr(leadership_analysis.output, 'investor_implications', 'Positive implications'),
+            'overall_impact': getattr(leadership_analysis.output, 'overall_impact', 'Positive')
+        }
+
+    update_analysis_results(ticker, period, financial_data, sentiment_data, leadership_data)
+
+async def RunAnalysis(pdfBytes: bytes, filename: str, analyst_name: str, gemini_api_key: str, tavily_api_key: str,
+                      update_db: bool = True, on_update: Optional[Callable[[str, Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """
+    Run the full pipeline for one document: parse and search, the concurrent
+    analysis agents, the database update and the combined JSON.
+    Returns a results dictionary that can be rendered or saved without re-running anything.
+    on_update(section, results) is called as soon as each section of the results is filled in
+    ("content", "sentiment", "financial", "leadership_search", "leadership_analysis",
+    "combined_results", or "error"), so a UI can show every agent's result when it completes.
+    """
+    timer = StageTimer()
+    results: Dict[str, Any] = {"filename": filename, "analyst_name": analyst_name, "timer": timer}
+
+    def Publish(section: str, value: Any) -> None:
+        results[section] = value
+        if on_update is not None:
+            on_update(section, results)
+
+    async def TrackSection(section: str, stage: str, awaitable) -> Any:
+        """Run one analysis agent and publish its result (or exception) the moment it finishes."""
+        try:
+            value = await timer.track(stage, awaitable)
+        except Exception as e:
+            value = e
+        Publish(section, value)
+        return value
+
+    async def TrackLeadership() -> None:
+        try:
+            _, leadership_analysis = await RunLeadershipPipeline(
+                ticker, period, gemini_api_key, timer, speculative,
+                on_search=lambda leadership_search: Publish("leadership_search", leadership_search)
+            )
+            Publish("leadership_analysis", leadership_analysis)
+        except Exception as e:
+            if "leadership_search" not in results:
+                Publish("leadership_search", e)
+            Publish("leadership_analysis", e)
+
+    # Start the searches from the filename's ticker and period while the PDF is parsed
+    speculative = StartSpeculativeSearches(filename, gemini_api_key, tavily_api_key, timer)
+
+    # Parse PDF and perform search
+    try:
+        content = await timer.track(
+            "Parse PDF & internet search",
+            ParsePDFAndSearch(pdfBytes, gemini_api_key, tavily_api_key, analyst_name, speculative)
+        )
+    except BaseException:
+        if speculative is not None:
+            speculative.cancel()
+        raise
+    Publish("content", content)
+
+    ticker = content.get("ticker", "")
+    period = content.get("period", "")
+
+    # Run sentiment, financial, and leadership analysis concurrently; each result is published as it completes
+    try:
+        await timer.track(
+            "Concurrent analysis (wall clock)",
+            asyncio.gather(
+                TrackSection("sentiment", "Sentiment analysis", sentimentAnalysis.AnalyzeSentiment(content, gemini_api_key)),
+                TrackSection("financial", "Financial analysis", financialAnalysis.AnalyzeFinancial(ticker, period, gemini_api_key)),
+                TrackLeadership(),
+            )
+        )
+    except Exception as e:
+        Publish("error", e)
+        return results
+
+    sentiment = results["sentiment"]
+    financial = results["financial"]
+    leadership_search = results["leadership_search"]
+    leadership_analysis = results["leadership_analysis"]
+
+    # Update database with analysis results
+    if update_db:
+        try:
+            with timer.stage("Database update"):
+                UpdateDatabase(ticker, period, analyst_name, financial, sentiment, leadership_analysis)
+        except Exception as db_error:
+            results["db_error"] = db_error
+
+    # Combine all analysis results into a single JSON structure
+    try:
+        results["combined_results"] = combine_analysis_results(
+            parsed_content=content,
+            financial_analysis=financial if not isinstance(financial, Exception) else None,
+            sentiment_analysis=sentiment if not isinstance(sentiment, Exception) else None,
+            leadership_analysis=leadership_analysis if not isinstance(leadership_analysis, Exception) else None,
+            leadership_search=leadership_search if not isinstance(leadership_search, Exception) else None,
+            analyst_name=analyst_name,
+            filename=filename
+        )
+    except Exception as combine_error:
+        results["combine_error"] = combine_error
+    if on_update is not None:
+        on_update("combined_results", results)
+
+    return results
@@ -0,0 +1,174 @@
+"""
+Headless batch runner: analyses every analyst PDF in a directory without the Streamlit UI.
+
+Documents are processed concurrently under a configurable limit, all Gemini/Tavily calls share the
+process-wide rate limiters, and one *_combined_analysis.json is written per input. Progress is
+recorded in a manifest inside the output directory so an interrupted run can be resumed.
+
+Usage:
+    python -m src.utils.batchRunner util/pdf-reports --output-dir reports --concurrency 4
+"""
+
+import argparse
+import asyncio
+import glob
+import hashlib
+import json
+import os
+import sys
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from src.utils.analysisPipeline import ExtractAnalystName, ParseReportFilename, RunAnalysis
+from src.utils.combineAnalysis import save_combined_results
+from src.utils.rateLimiter import duckduckgo_limiter, gemini_limiter, tavily_limiter
+from src.search.searchTools import stub_mode
+
+MANIFEST_NAME = "batch_manifest.json"
+
+
+class BatchManifest:
+    """
+    Tracks which inputs (by SHA-256 of their bytes and their filename) have finished and where their
+    output went. The filename is part of the key because it names the analyst: byte-identical reports
+    filed by two analysts have two outputs. Saved after every document with an atomic replace, so a
+    crash loses at most in-flight work.
+    """
+
+    def __init__(self, output_dir: str):
+        self.path = os.path.join(output_dir, MANIFEST_NAME)
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f).get("completed", {})
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def key(file_hash: str, filename: str) -> str:
+        # Filenames cannot contain "/", so the key is unambiguous
+        return f"{file_hash}/{filename}"
+
+    def is_done(self, file_hash: str, filename: str) -> bool:
+        entry = self.entries.get(self.key(file_hash, filename))
+        return bool(entry) and os.path.exists(entry.get("output", ""))
+
+    async def mark_done(self, file_hash: str, filename: str, source: str, output: str) -> None:
+        async with self._lock:
+            # Every input has its own output; a shared one would mark a lost result as done
+            key = self.key(file_hash, filename)
+            for other_key, entry in self.entries.items():
+                if other_key != key and os.path.abspath(entry.get("output", "")) == os.path.abspath(output):
+                    raise ValueError(f"{filename}: output {output} is already recorded for {entry.get('source')}")
+            self.entries[key] = {
+                "source": source,
+                "output": output,
+                "completed_at": datetime.now().isoformat(),
+            }
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"completed": self.entries}, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+
+async def AnalyzeDocument(path: str, manifest: BatchManifest, semaphore: asyncio.Semaphore, output_dir: str,
+                          gemini_api_key: str, tavily_api_key: str, update_db: bool) -> Dict[str, Any]:
+    """
+    Analyse one PDF under the concurrency limit and record it in the manifest.
+    Returns a status dictionary for the run summary.
+    """
+    filename = os.path.basename(path)
+    with open(path, "rb") as f:
+        pdfBytes = f.read()
+    file_hash = hashlib.sha256(pdfBytes).hexdigest()
+
+    if manifest.is_done(file_hash, filename):
+        return {"file": filename, "status": "skipped", "output": manifest.entries[manifest.key(file_hash, filename)]["output"]}
+
+    # Filename convention: <analyst name> - <ticker> <quarter> <year>
+    analyst_name = ExtractAnalystName(filename)
+    expected = ParseReportFilename(filename)
+
+    async with semaphore:
+        print(f"Processing {filename} ({expected['ticker'] or '?'} {expected['period'] or '?'}, analyst {analyst_name})...")
+        try:
+            results = await RunAnalysis(pdfBytes, filename, analyst_name, gemini_api_key, tavily_api_key, update_db=update_db)
+        except Exception as e:
+            print(f"Failed {filename}: {e}")
+            return {"file": filename, "status": "failed", "error": str(e)}
+
+    if "combined_results" not in results:
+        error = results.get("error") or results.get("combine_error")
+        print(f"Failed {filename}: {error}")
+        return {"file": filename, "status": "failed", "error": str(error)}
+
+    output_path = save_combined_results(results["combined_results"], filename, output_dir)
+    try:
+        await manifest.mark_done(file_hash, filename, path, output_path)
+    except ValueError as e:
+        print(f"Failed {filename}: {e}")
+        return {"file": filename, "status": "failed", "error": str(e)}
+    timings = ", ".join(f"{row['stage']}: {row['seconds']}s" for row in results["timer"].as_rows())
+    print(f"Finished {filename} -> {output_path} ({timings})")
+    return {"file": filename, "status": "completed", "output": output_path}
+
+
+async def RunBatch(input_paths: List[str], output_dir: str, concurrency: int, gemini_api_key: str,
+                   tavily_api_key: str, update_db: bool = True) -> List[Dict[str, Any]]:
+    """Analyse the given PDFs with at most `concurrency` documents in flight."""
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = BatchManifest(output_dir)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    return await asyncio.gather(*[
+        AnalyzeDocument(path, manifest, semaphore, output_dir, gemini_api_key, tavily_api_key, update_db)
+        for path in input_paths
+    ])
+
+
+def main(argv: Optional[List[str]] = None):
+    """Main function for command-line usage."""
+    parser = argparse.ArgumentParser(description="Analyse a directory of analyst PDF reports.")
+    parser.add_argument("input_dir", help="Directory containing '<analyst> - <ticker> <quarter> <year>.pdf' files")
+    parser.add_argument("--output-dir", default="reports", help="Where combined analysis JSON files are written")
+    parser.add_argument("--concurrency", type=int, default=4, help="Number of documents analysed at the same time")
+    parser.add_argument("--gemini-rpm", type=float, default=None, help="Global Gemini requests per minute (0 = unlimited)")
+    parser.add_argument("--tavily-rpm", type=float, default=None, help="Global Tavily searches per minute (0 = unlimited)")
+    parser.add_argument("--duckduckgo-rpm", type=float, default=None, help="Global DuckDuckGo searches per minute (0 = unlimited)")
+    parser.add_argument("--no-db", action="store_true", help="Do not write analysis rows to finance.db")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    gemini_api_key = os.getenv("GEMINI_API_KEY")
+    tavily_api_key = os.getenv("TAVILY_API_KEY")
+    # The offline search stub (SEARCH_PROVIDER=stub) needs no Tavily key
+    if not gemini_api_key or not (tavily_api_key or stub_mode()):
+        print("API keys not found. Please set GEMINI_API_KEY and TAVILY_API_KEY in your .env file.")
+        sys.exit(1)
+
+    if args.gemini_rpm is not None:
+        gemini_limiter.configure(args.gemini_rpm)
+    if args.tavily_rpm is not None:
+        tavily_limiter.configure(args.tavily_rpm)
+    if args.duckduckgo_rpm is not None:
+        duckduckgo_limiter.configure(args.duckduckgo_rpm)
+
+    input_paths = sorted(glob.glob(os.path.join(args.input_dir, "*.pdf")))
+    if not input_paths:
+        print(f"No PDF files found in {args.input_dir}")
+        return
+
+    statuses = asyncio.run(RunBatch(
+        input_paths, args.output_dir, args.concurrency, gemini_api_key, tavily_api_key, update_db=not args.no_db
+    ))
+
+    counts: Dict[str, int] = {}
+    for status in statuses:
+        counts[status["status"]] = counts.get(status["status"], 0) + 1
+    print("\nSummary: " + ", ".join(f"{count} {status}" for status, count in sorted(counts.items())))
+    if counts.get("failed"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
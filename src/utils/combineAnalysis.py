@@ -1,4 +1,5 @@
 import json
+import re
 from typing import Dict, Any, Optional
 from datetime import datetime
 
@@ -9,7 +10,8 @@ def combine_analysis_results(
     sentiment_analysis: Any,
     leadership_analysis: Any,
     analyst_name: str,
-    filename: str
+    filename: str,
+    leadership_search: Optional[Dict[str, Any]] = None
 ) -> Dict[str, Any]:
     """
     Combine all analysis results into a single comprehensive JSON structure.
@@ -21,6 +23,7 @@ def combine_analysis_results(
         leadership_analysis: Leadership analysis results
         analyst_name: Name of the analyst
         filename: Original filename
+        leadership_search: Structured leadership findings the leadership analysis was based on
         
     Returns:
         Combined analysis results as a dictionary
@@ -91,6 +94,10 @@ def combine_analysis_results(
             "error": "No leadership analysis results available"
         }
     
+    # Keep the leadership evidence the leadership analysis was grounded in
+    if leadership_search is not None:
+        combined_results["leadership_search"] = leadership_search
+    
     # Add summary section
     combined_results["summary"] = {
         "ticker": parsed_content.get("ticker", "Unknown"),
@@ -113,7 +120,7 @@ def save_combined_results(
     
     Args:
         combined_results: Combined analysis results
-        filename: Base filename (without extension)
+        filename: Name of the input file; its stem is part of the output name, so every input gets its own file
         output_dir: Directory to save the file
         
     Returns:
@@ -129,11 +136,29 @@ def save_combined_results(
     ticker = combined_results.get("summary", {}).get("ticker", "UNKNOWN")
     period = combined_results.get("summary", {}).get("period", "UNKNOWN").replace(" ", "_")
     
-    output_filename = f"{ticker}_{period}_{timestamp}_combined_analysis.json"
-    output_path = os.path.join(output_dir, output_filename)
+    analyst_name = combined_results.get("summary", {}).get("analyst_name") or "UNKNOWN"
+    analyst_safe = analyst_name.replace(' ', '_').replace('-', '_').replace('.', '_')
+    
+    # Include the analyst and the input file so reports on the same ticker and period
+    # (other analysts, revised notes, near-identical filenames) do not overwrite each other
+    source = os.path.splitext(os.path.basename(filename or ""))[0]
+    source_safe = re.sub(r"[^A-Za-z0-9]+", "_", source).strip("_") or "input"
+    base_name = f"{ticker}_{period}_{analyst_safe}_{source_safe}_{timestamp}"
+    
+    # Never overwrite an existing file: concurrent runs finishing in the same second get a numbered suffix
+    suffix = 0
+    while True:
+        output_filename = f"{base_name}{f'_{suffix}' if suffix else ''}_combined_analysis.json"
+        output_path = os.path.join(output_dir, output_filename)
+        try:
+            f = open(output_path, 'x', encoding='utf-8')
+        except FileExistsError:
+            suffix += 1
+            continue
+        break
     
     # Save to JSON file
-    with open(output_path, 'w', encoding='utf-8') as f:
+    with f:
         json.dump(combined_results, f, indent=2, ensure_ascii=False, default=str)
     
     return output_path
@@ -0,0 +1,268 @@
+"""
+Disk-backed response cache for LLM agent calls.
+
+Responses are keyed by a content hash of the prompt inputs, the model name and the output schema,
+and stored in a SQLite file next to finance.db. Each agent has its own freshness (TTL) and the
+cache is bounded in size with least-recently-used eviction.
+"""
+
+import contextvars
+import dataclasses
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Optional, Sequence
+
+from pydantic import BaseModel
+from pydantic_ai import BinaryContent
+
+
+# Get the project root directory (3 levels up from src/utils/)
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+llm_cache_db = os.path.join(project_root, "util", "database", "llm_cache.db")
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+
+# Freshness per agent (seconds). PDF parsing only depends on the document bytes,
+# while anything backed by web search goes stale quickly.
+AGENT_TTLS = {
+    "fileParser": 30 * DAY,
+    "summarizer": 30 * DAY,
+    "sentimentAnalysis": 7 * DAY,
+    "leadershipAnalysis": 7 * DAY,
+    "financialAnalysis": 1 * DAY,
+    "leadershipSearch": 1 * DAY,
+    "internetSearch": 6 * HOUR,
+    # Raw web search results (src/search/searchTools)
+    "tavily_search": 6 * HOUR,
+    "duckduckgo_search": 6 * HOUR,
+}
+DEFAULT_TTL = 1 * DAY
+
+# Upper bound on the total size of cached responses before LRU eviction kicks in
+MAX_CACHE_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+
+def get_ttl(agent_name: str) -> int:
+    """
+    Return the TTL in seconds for an agent.
+    Can be overridden per agent with an environment variable, e.g. LLM_CACHE_TTL_INTERNETSEARCH=600.
+    """
+    override = os.getenv(f"LLM_CACHE_TTL_{agent_name.upper()}")
+    if override is not None:
+        try:
+            return int(override)
+        except ValueError:
+            pass
+    return AGENT_TTLS.get(agent_name, DEFAULT_TTL)
+
+
+def cache_enabled() -> bool:
+    """The cache can be switched off with LLM_CACHE_DISABLED=1."""
+    return os.getenv("LLM_CACHE_DISABLED", "").lower() not in ("1", "true", "yes")
+
+
+# When set, cached responses are ignored and overwritten with fresh ones
+_refresh = contextvars.ContextVar("llm_cache_refresh", default=False)
+
+
+@contextmanager
+def refresh_cache():
+    """Force fresh agent runs inside this block; their results replace any cached entries."""
+    token = _refresh.set(True)
+    try:
+        yield
+    finally:
+        _refresh.reset(token)
+
+
+def refreshing() -> bool:
+    """Whether the current block runs under refresh_cache()."""
+    return _refresh.get()
+
+
+def _normalize_input(value: Any) -> Any:
+    """Turn a prompt part into a JSON-serialisable value; binary content is reduced to its hash."""
+    if isinstance(value, BinaryContent):
+        return {"media_type": value.media_type, "sha256": hashlib.sha256(value.data).hexdigest()}
+    if isinstance(value, (bytes, bytearray)):
+        return {"sha256": hashlib.sha256(value).hexdigest()}
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return _normalize_input(dataclasses.asdict(value))
+    if isinstance(value, (list, tuple)):
+        return [_normalize_input(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): _normalize_input(v) for k, v in value.items()}
+    return value
+
+
+def _schema_fingerprint(output_type: Any) -> Any:
+    """Describe the output schema so that schema changes produce new cache keys."""
+    if isinstance(output_type, type) and issubclass(output_type, BaseModel):
+        return output_type.model_json_schema()
+    return getattr(output_type, "__name__", repr(output_type))
+
+
+def make_cache_key(agent_name: str, model_name: str, output_type: Any, inputs: Sequence[Any]) -> str:
+    """
+    Build the cache key from the agent name, model name, output schema and a content hash of the inputs.
+    """
+    payload = {
+        "agent": agent_name,
+        "model": model_name,
+        "schema": _schema_fingerprint(output_type),
+        "inputs": _normalize_input(list(inputs)),
+    }
+    encoded = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class CachedResult:
+    """Mimics an agent run result for responses served from the cache."""
+
+    def __init__(self, output):
+        self.output = output
+        self.cached = True
+
+
+class LLMCache:
+    """
+    SQLite-backed key/value store for agent outputs with TTL expiry and size-bounded LRU eviction.
+    One connection is kept per thread.
+    """
+
+    def __init__(self, path: str = llm_cache_db, max_bytes: int = MAX_CACHE_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    agent TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    output TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_accessed REAL NOT NULL
+                )
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_accessed ON llm_cache(last_accessed)")
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str, output_type: Any = str) -> Optional[Any]:
+        """Return the cached output for a key, or None when missing or expired."""
+        conn = self._connection()
+        now = time.time()
+        row = conn.execute(
+            "SELECT output, expires_at FROM llm_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        output, expires_at = row
+        if expires_at < now:
+            conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            conn.commit()
+            return None
+        conn.execute("UPDATE llm_cache SET last_accessed = ? WHERE key = ?", (now, key))
+        conn.commit()
+        if isinstance(output_type, type) and issubclass(output_type, BaseModel):
+            return output_type.model_validate_json(output)
+        return json.loads(output)
+
+    def set(self, key: str, agent_name: str, model_name: str, output: Any, ttl: int) -> None:
+        """Store an output under a key and evict least-recently-used entries if over budget."""
+        if isinstance(output, BaseModel):
+            encoded = output.model_dump_json()
+        else:
+            encoded = json.dumps(output, default=str)
+        now = time.time()
+        conn = self._connection()
+        conn.execute('''
+            INSERT OR REPLACE INTO llm_cache
+            (key, agent, model, output, size, created_at, expires_at, last_accessed)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (key, agent_name, model_name, encoded, len(encoded), now, now + ttl, now))
+        self._evict(conn, now)
+        conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        """Drop expired entries, then the least recently used ones until under the size budget."""
+        conn.execute("DELETE FROM llm_cache WHERE expires_at < ?", (now,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        conn.execute('''
+            DELETE FROM llm_cache WHERE key IN (
+                SELECT key FROM (
+                    SELECT key, SUM(size) OVER (ORDER BY last_accessed DESC) AS running
+                    FROM llm_cache
+                ) WHERE running > ?
+            )
+        ''', (self.max_bytes,))
+
+    def clear(self, agent_name: Optional[str] = None) -> None:
+        """Remove all entries, or only those of one agent."""
+        conn = self._connection()
+        if agent_name is None:
+            conn.execute("DELETE FROM llm_cache")
+        else:
+            conn.execute("DELETE FROM llm_cache WHERE agent = ?", (agent_name,))
+        conn.commit()
+
+
+llm_cache = LLMCache()
+
+
+async def run_agent_cached(agent_name: str, agent, user_prompt, model_name: str, output_type: Any = str, key_inputs: Sequence[Any] = (), limiters: Sequence[Any] = (), deps: Any = None):
+    """
+    Run an agent through the response cache.
+    key_inputs holds anything besides the user prompt that shapes the answer (e.g. the system prompt).
+    limiters are extra rate limiters to wait on before an uncached run, e.g. for search APIs; Gemini's own
+    limit is applied per model request by the HTTP clients of src/utils/agentRegistry.
+    deps are the run-time dependencies passed to the agent; they are part of the cache key.
+    """
+    if not cache_enabled():
+        for limiter in limiters:
+            await limiter.acquire()
+        return await agent.run(user_prompt, deps=deps)
+    key = make_cache_key(agent_name, model_name, output_type, [user_prompt, *key_inputs, deps])
+    cached = None if _refresh.get() else llm_cache.get(key, output_type)
+    if cached is not None:
+        return CachedResult(cached)
+    # Only runs that actually reach the model count against the rate limits
+    for limiter in limiters:
+        await limiter.acquire()
+    result = await agent.run(user_prompt, deps=deps)
+    llm_cache.set(key, agent_name, model_name, result.output, get_ttl(agent_name))
+    return result
+
+
+def run_agent_cached_sync(agent_name: str, agent, user_prompt, model_name: str, output_type: Any = str, key_inputs: Sequence[Any] = (), deps: Any = None):
+    """Synchronous counterpart of run_agent_cached for agents driven with run_sync."""
+    if not cache_enabled():
+        return agent.run_sync(user_prompt, deps=deps)
+    key = make_cache_key(agent_name, model_name, output_type, [user_prompt, *key_inputs, deps])
+    cached = None if _refresh.get() else llm_cache.get(key, output_type)
+    if cached is not None:
+        return CachedResult(cached)
+    result = agent.run_sync(user_prompt, deps=deps)
+    llm_cache.set(key, agent_name, model_name, result.output, get_ttl(agent_name))
+    return result
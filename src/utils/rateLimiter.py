@@ -0,0 +1,64 @@
+"""
+Process-wide rate limiters for the external APIs used by the agents (Gemini, Tavily and DuckDuckGo).
+Limits are configured in requests per minute through GEMINI_RPM, TAVILY_RPM and DUCKDUCKGO_RPM
+(0 disables a limit).
+"""
+
+import asyncio
+import os
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Spaces requests evenly at `rate_per_minute`, allowing short bursts of up to `burst` requests.
+    Slots are reserved under a lock, so the limiter is shared safely by coroutines and threads.
+    """
+
+    def __init__(self, rate_per_minute: float, burst: int = 1):
+        self.burst = max(1, burst)
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+        self.configure(rate_per_minute)
+
+    def configure(self, rate_per_minute: float) -> None:
+        """Change the rate; a rate of 0 or less disables limiting."""
+        with self._lock:
+            self.rate_per_minute = rate_per_minute
+            self.interval = 60.0 / rate_per_minute if rate_per_minute and rate_per_minute > 0 else 0.0
+
+    def _reserve(self) -> float:
+        """Reserve the next free slot and return how long the caller has to wait for it."""
+        with self._lock:
+            if self.interval == 0.0:
+                return 0.0
+            now = time.monotonic()
+            slot = max(self._next_slot, now - (self.burst - 1) * self.interval)
+            self._next_slot = slot + self.interval
+            return max(0.0, slot - now)
+
+    async def acquire(self) -> None:
+        """Wait (without blocking the event loop) until a request may be sent."""
+        delay = self._reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def acquire_sync(self) -> None:
+        """Blocking counterpart of acquire for synchronous callers."""
+        delay = self._reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def _rate_from_env(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+# Shared limiters; every Gemini model request (src/utils/agentRegistry) and every search request (src/search/searchTools) goes through these
+gemini_limiter = RateLimiter(_rate_from_env("GEMINI_RPM", 0), burst=int(_rate_from_env("GEMINI_BURST", 4)))
+tavily_limiter = RateLimiter(_rate_from_env("TAVILY_RPM", 0), burst=int(_rate_from_env("TAVILY_BURST", 2)))
+duckduckgo_limiter = RateLimiter(_rate_from_env("DUCKDUCKGO_RPM", 0), burst=int(_rate_from_env("DUCKDUCKGO_BURST", 2)))
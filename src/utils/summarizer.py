@@ -3,29 +3,36 @@ Summarizer Agent: Takes a PDF file and returns a summary, all numerical data, an
 """
 
 # --- Imports for AI agent and model ---
-from pydantic_ai import Agent, BinaryContent
-from pydantic_ai.models.gemini import GeminiModel
-from pydantic_ai.providers.google_gla import GoogleGLAProvider
+from pydantic_ai import Agent
+from src.data import pdfExtract
+from src.utils import agentRegistry
+from src.utils.llmCache import run_agent_cached_sync
+
+# Gemini model used for summarization
+MODEL_NAME = 'gemini-2.0-flash'
+
+def _BuildAgent(api_key):
+    """Build the summarizer agent; called once per API key through the agent registry."""
+    return Agent(model=agentRegistry.get_model(MODEL_NAME, api_key))
 
 def SummarizeFile(uploaded_file, api_key):
     """
     Summarize a financial/analyst PDF report, extract all numerical data, and provide future outlook.
     Returns a summary string or structured output from the agent.
     """
-    # Initialize Gemini model for summarization
-    model = GeminiModel('gemini-2.0-flash', provider=GoogleGLAProvider(api_key=api_key))
-    agent = Agent(model=model)
+    agent = agentRegistry.get_agent("summarizer", _BuildAgent, api_key)
 
     # Prompt for summarization and extraction
     prompt = (
         "You are an AI agent that works on financial/analyst reports of companies. "
-        "Summarize the file content uploaded to you, list out all the numerical data in the document, "
+        "Summarize the report content given to you (the PDF itself or text extracted from its relevant pages), "
+        "list out all the numerical data in the document, "
         "and provide the future outlook of the company based on the data."
     )
 
-    # Run the agent with the prompt and PDF file
-    result = agent.run_sync([
+    # Run the agent with the prompt and the report's extracted pages (or the PDF file as a fallback)
+    result = run_agent_cached_sync("summarizer", agent, [
         prompt,
-        BinaryContent(uploaded_file, media_type='application/pdf'),
-    ])
+        *pdfExtract.report_inputs(uploaded_file),
+    ], model_name=MODEL_NAME)
     return result
\ No newline at end of file
@@ -0,0 +1,45 @@
+"""
+Stage timing helpers for the analysis pipeline.
+Records wall-clock durations per named stage so the cost of each agent can be compared.
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Dict, List
+
+
+class StageTimer:
+    """
+    Collects wall-clock durations (in seconds) for named pipeline stages.
+    Stages are reported in the order they were started.
+    """
+
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time a synchronous block of code under the given stage name."""
+        self.timings.setdefault(name, 0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = time.perf_counter() - start
+
+    async def track(self, name: str, awaitable: Awaitable[Any]) -> Any:
+        """Await a coroutine and record how long it took under the given stage name."""
+        # Reserve the stage's slot now, so overlapping stages stay in start order
+        self.timings.setdefault(name, 0.0)
+        start = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self.timings[name] = time.perf_counter() - start
+
+    def as_rows(self) -> List[Dict[str, Any]]:
+        """Return the recorded timings as table rows for display."""
+        return [
+            {"stage": name, "seconds": round(seconds, 3)}
+            for name, seconds in self.timings.items()
+        ]